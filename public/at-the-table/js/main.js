@@ -1,6 +1,7 @@
 class App {
   constructor(options = {}) {
     const defaults = {
+      dataFormat: 'json', // or 'bin' for compact binary data files
       project: 'mary-church-terrell',
     };
     this.qparams = StringUtil.queryParams();
@@ -39,11 +40,19 @@ class App {
 
     this.savedPrompts = StringUtil.loadFromStorage('saved-prompts') || [];
 
-    const promptDataURL = `../data/${this.options.project}/prompts.json`;
-    const promptDataPromise = $.getJSON(promptDataURL, (data) => data);
+    const { dataFormat } = this.options;
+    const promptDataURL = `../data/${this.options.project}/prompts.${dataFormat}`;
+    const promptDataPromise = DataUtil.loadData(promptDataURL);
 
-    const transcriptDataURL = `../data/${this.options.project}/prompts-docs.json`;
-    const transcriptDataPromise = $.getJSON(transcriptDataURL, (data) => data);
+    // documents are only loaded when they are viewed
+    const transcriptDataURL = `../data/${this.options.project}/prompts-docs.${dataFormat}`;
+    this.documentStore = new DocumentStore(transcriptDataURL, (doc) => {
+      const updatedDoc = doc;
+      updatedDoc.id = doc.index;
+      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
+      updatedDoc.DownloadUrl = `https://tile.loc.gov/image-services/iiif/${doc.DownloadUrl}/full/pct:100/0/default.jpg`;
+      return updatedDoc;
+    }, true);
     const imagePromise = $.Deferred();
 
     // wait to load collage images
@@ -70,9 +79,8 @@ class App {
 
     this.loadFilters();
     this.renderFilters();
-    $.when(promptDataPromise, transcriptDataPromise, imagePromise).done((pdata, tdata, idata) => {
-      this.onTranscriptDataLoad(tdata[0].docs);
-      this.onPromptDataLoad(pdata[0]);
+    $.when(promptDataPromise, imagePromise).done((pdata, idata) => {
+      this.onPromptDataLoad(pdata);
     });
   }
 
@@ -385,18 +393,6 @@ class App {
     this.loadListeners();
   }
 
-  onTranscriptDataLoad(transcriptData) {
-    this.documents = DataUtil.loadCollectionFromRows(transcriptData, (doc) => {
-      const updatedDoc = doc;
-      updatedDoc.id = doc.index;
-      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
-      updatedDoc.DownloadUrl = `https://tile.loc.gov/image-services/iiif/${doc.DownloadUrl}/full/pct:100/0/default.jpg`;
-      return updatedDoc;
-    }, true);
-    console.log('Transcript data loaded.');
-    this.transcriptsLoaded = true;
-  }
-
   static preloadImage(url) {
     const img = new Image();
     img.src = url;
@@ -471,7 +467,7 @@ class App {
 
   renderDocument(promptIndex = false) {
     const {
-      documents, $documentModal, state, filteredPrompts, prompts,
+      state, filteredPrompts, prompts,
     } = this;
     let prompt;
     if (promptIndex !== false) {
@@ -479,7 +475,13 @@ class App {
     } else {
       prompt = this.constructor.getPrompt(filteredPrompts, state.prompt);
     }
-    const doc = documents[prompt.doc];
+    this.documentStore.get([prompt.doc]).done(([doc]) => {
+      this.renderPromptDocument(prompt, doc);
+    });
+  }
+
+  renderPromptDocument(prompt, doc) {
+    const { $documentModal } = this;
     const $document = $documentModal.find('#document-container');
     const $title = $documentModal.find('.resource-link');
     const text = doc.Transcription.replace(/\s+/g, ' ').replace(/\s\s+/g, ' ');
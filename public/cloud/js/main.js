@@ -1,6 +1,7 @@
 class App {
   constructor(options = {}) {
     const defaults = {
+      dataFormat: 'json', // or 'bin' for compact binary data files
       maxWordsDisplay: 1000,
       project: 'mary-church-terrell',
     };
@@ -17,21 +18,22 @@ class App {
     this.selected = {};
     this.currentDocumentIndex = 0;
 
-    const timelineDataURL = `../data/${this.options.project}/cloud.json`;
-    const timelineDataPromise = $.getJSON(timelineDataURL, (data) => data);
+    const timelineDataURL = `../data/${this.options.project}/cloud.${this.options.dataFormat}`;
+    const timelineDataPromise = DataUtil.loadData(timelineDataURL);
 
-    const transcriptDataURL = `../data/${this.options.project}/transcripts.json`;
-    const transcriptDataPromise = $.getJSON(transcriptDataURL, (data) => data);
-    this.transcriptDataPromise = $.Deferred();
+    // documents are only loaded when they are viewed
+    const transcriptDataURL = `../data/${this.options.project}/transcripts.${this.options.dataFormat}`;
+    this.documentStore = new DocumentStore(transcriptDataURL, (doc) => {
+      const updatedDoc = doc;
+      updatedDoc.id = doc.index;
+      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
+      updatedDoc.DownloadUrl = `https://tile.loc.gov/image-services/iiif/${doc.DownloadUrl}/full/pct:100/0/default.jpg`;
+      return updatedDoc;
+    });
 
     $.when(timelineDataPromise).done((data) => {
       this.onCloudDataLoad(data);
     });
-
-    $.when(transcriptDataPromise).done((data) => {
-      this.onTranscriptDataLoad(data);
-      this.transcriptDataPromise.resolve();
-    });
   }
 
   filterData() {
@@ -172,18 +174,6 @@ class App {
     this.loadListeners();
   }
 
-  onTranscriptDataLoad(transcriptData) {
-    this.documents = DataUtil.loadCollectionFromRows(transcriptData, (doc) => {
-      const updatedDoc = doc;
-      updatedDoc.id = doc.index;
-      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
-      updatedDoc.DownloadUrl = `https://tile.loc.gov/image-services/iiif/${doc.DownloadUrl}/full/pct:100/0/default.jpg`;
-      return updatedDoc;
-    });
-    console.log('Transcript data loaded.');
-    this.transcriptsLoaded = true;
-  }
-
   renderDocument() {
     const { currentDocumentIndex, documentsViewing, $documentModal } = this;
     const $document = $documentModal.find('#document-container');
@@ -290,8 +280,8 @@ class App {
     this.documentsViewing = [];
     this.selectedWord = word.lemma;
 
-    $.when(this.transcriptDataPromise).done(() => {
-      let docs = docIndices.map((docIndex) => this.documents[docIndex]);
+    this.documentStore.get(docIndices).done((wordDocs) => {
+      let docs = wordDocs;
       if (selected.year >= 0) {
         docs = docs.filter((d) => d.EstimatedYear === selected.year);
       }
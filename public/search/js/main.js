@@ -40,17 +40,25 @@ class App {
     });
   }
 
-  indexTranscriptData(documents) {
-    this.loadingOn('Data parsed; indexing transcript data...');
-    const index = new FlexSearch.Index({
-      tokenize: 'forward',
-    });
-    // console.log(documents);
-    documents.forEach((document) => {
-      index.add(document.id, document.Transcription);
-    });
-    this.searchIndex = index;
-    this.transcriptDataPromise.resolve();
+  // Fall back to indexing every transcript in the browser when there is no prebuilt search index
+  indexTranscriptData() {
+    this.loadingOn('Loading transcript data... (0%)');
+    this.documentStore.getAll((loadedCount, shardCount) => {
+      const percentComplete = Math.round((loadedCount / shardCount) * 100);
+      this.loadingOn(`Loading transcript data... (${percentComplete}%)`);
+    }).done((documents) => {
+      this.loadingOn('Data parsed; indexing transcript data...');
+      const index = new FlexSearch.Index({
+        tokenize: 'forward',
+      });
+      documents.forEach((document) => {
+        index.add(document.id, document.Transcription);
+      });
+      this.searchIndex = {
+        search: (q, limit) => index.searchAsync(q, limit),
+      };
+      this.transcriptDataPromise.resolve();
+    }).fail(() => this.transcriptDataPromise.reject());
   }
 
   loadingOff() {
@@ -87,28 +95,22 @@ class App {
 
   loadTranscriptData() {
     const dataUrl = `../data/${this.options.project}/transcripts.json`;
+    const searchIndexUrl = `../data/${this.options.project}/search-index.json`;
     this.transcriptDataPromise = $.Deferred();
-    this.loadingOn('Loading transcript data... (0%)');
-    let prevComplete = 0;
-    $.ajax({
-      xhr: () => {
-        const xhr = new window.XMLHttpRequest();
-        xhr.addEventListener('progress', (evt) => {
-          if (evt.lengthComputable) {
-            const percentComplete = Math.round((evt.loaded / evt.total) * 100);
-            if (percentComplete !== prevComplete) {
-              this.loadingOn(`Loading transcript data... (${percentComplete}%)`);
-              prevComplete = percentComplete;
-            }
-          }
-        }, false);
-        return xhr;
-      },
-      type: 'GET',
-      url: dataUrl,
-      success: (data) => this.parseTranscriptData(data),
-      error: this.transcriptDataPromise.fail(),
+    this.loadingOn('Loading search index...');
+    // transcripts are only loaded when they show up in the results
+    this.documentStore = new DocumentStore(dataUrl, (doc) => {
+      const updatedDoc = doc;
+      updatedDoc.id = doc.index;
+      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
+      updatedDoc.DownloadUrl = `https://tile.loc.gov/image-services/iiif/${doc.DownloadUrl}/full/pct:100/0/default.jpg`;
+      return updatedDoc;
     });
+    const searchIndex = new SearchIndex(searchIndexUrl);
+    searchIndex.manifestPromise.done(() => {
+      this.searchIndex = searchIndex;
+      this.transcriptDataPromise.resolve();
+    }).fail(() => this.indexTranscriptData());
     return this.transcriptDataPromise;
   }
 
@@ -121,29 +123,16 @@ class App {
     this.loadListeners();
   }
 
-  parseTranscriptData(data) {
-    this.loadingOn('Transcript data loaded; parsing data...');
-    this.documents = DataUtil.loadCollectionFromRows(data, (doc) => {
-      const updatedDoc = doc;
-      updatedDoc.id = doc.index;
-      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
-      updatedDoc.DownloadUrl = `https://tile.loc.gov/image-services/iiif/${doc.DownloadUrl}/full/pct:100/0/default.jpg`;
-      return updatedDoc;
-    });
-    this.indexTranscriptData(this.documents);
-  }
-
-  renderResults(results, query) {
-    this.$message.html(`There are <strong>${results.length} results</strong> for "${query}" in the transcript data.`);
+  renderResults(documents, query) {
+    this.$message.html(`There are <strong>${documents.length} results</strong> for "${query}" in the transcript data.`);
     let html = '';
     const { wordPad } = this.options;
-    results.forEach((result, i) => {
-      const document = this.documents[result];
+    documents.forEach((document, i) => {
       const text = document.Transcription;
       const matchText = StringUtil.getHighlightedText(text, query, wordPad, wordPad);
       const data = {
         className: i > 0 ? '' : 'selected',
-        id: result,
+        id: document.id,
         matchText,
         sequence: i + 1,
         title: document.Item,
@@ -159,20 +148,23 @@ class App {
     this.$item.removeClass('active');
     this.loadingOn(`Looking for keyword "${q}" in transcripts...`);
     StringUtil.pushURLState({ q });
-    this.searchIndex.searchAsync(q, this.options.searchLimit, (results) => {
-      this.renderResults(results, q);
-      if (results.length > 0) this.selectItem(results[0]);
-      this.loadingOff();
-    });
+    $.when(this.searchIndex.search(q, this.options.searchLimit))
+      .then((results) => this.documentStore.get(results))
+      .done((documents) => {
+        this.renderResults(documents, q);
+        if (documents.length > 0) this.selectItem(documents[0].id);
+        this.loadingOff();
+      });
   }
 
   selectItem(index) {
     $('#search-results-list li').removeClass('selected');
     $(`#search-results-list li[data-id="${index}"]`).addClass('selected');
-    const document = this.documents[index];
-    const html = this.searchItemTemplate(document);
-    this.$item.html(html);
-    this.$item.addClass('active');
+    this.documentStore.get([index]).done(([document]) => {
+      const html = this.searchItemTemplate(document);
+      this.$item.html(html);
+      this.$item.addClass('active');
+    });
   }
 
   static updateContentViewMode() {
@@ -1,5 +1,78 @@
 class DataUtil {
+  // Decode a compact binary data file (.bin) written by `writeBinaryData` in scripts/utilities.py
+  static decodeBinary(buffer) {
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'MFPB') throw new Error('Not a binary data file');
+    const headerLength = new DataView(buffer).getUint32(4, true);
+    const decoder = new TextDecoder('utf-8');
+    const header = JSON.parse(decoder.decode(new Uint8Array(buffer, 8, headerLength)));
+    const bodyStart = Math.ceil((8 + headerLength) / 8) * 8;
+    const arrayTypes = {
+      uint8: Uint8Array,
+      uint16: Uint16Array,
+      uint32: Uint32Array,
+      int8: Int8Array,
+      int16: Int16Array,
+      int32: Int32Array,
+      float64: Float64Array,
+    };
+
+    const decodeArray = (descriptor) => {
+      if (descriptor.type === 'dictionary') {
+        const indices = decodeArray(descriptor.indices);
+        const offsets = decodeArray(descriptor.offsets);
+        const bytes = new Uint8Array(buffer, bodyStart + descriptor.data.offset, descriptor.data.byteLength);
+        const values = _.times(offsets.length - 1, (i) => {
+          const value = decoder.decode(bytes.subarray(offsets[i], offsets[i + 1]));
+          return descriptor.encoding === 'json' ? JSON.parse(value) : value;
+        });
+        return Array.from(indices, (i) => values[i]);
+      }
+      // typed arrays are views of the file's buffer, so they are not copied
+      const values = new arrayTypes[descriptor.type](buffer, bodyStart + descriptor.offset, descriptor.length);
+      if (_.has(descriptor, 'null')) {
+        const { sentinel, value: nullValue } = descriptor.null;
+        return Array.from(values, (value) => (value === sentinel ? nullValue : value));
+      }
+      return values;
+    };
+
+    const decode = (node) => {
+      if (_.isArray(node)) return node.map((value) => decode(value));
+      if (!_.isObject(node)) return node;
+      if (_.has(node, '$table')) {
+        const table = node.$table;
+        const groups = _.mapObject(table.groups || {}, (descriptor) => decodeArray(descriptor));
+        const columns = _.object(table.cols, table.columns.map((descriptor) => decodeArray(descriptor)));
+        return {
+          cols: table.cols, rowCount: table.rowCount, columns, groups,
+        };
+      }
+      if (_.has(node, '$array')) return decodeArray(node.$array);
+      return _.mapObject(node, (value) => decode(value));
+    };
+
+    return decode(header.data);
+  }
+
   static loadCollectionFromRows(data, customMap = false, isFlattened = false) {
+    // tables from binary data files are already split into columns
+    if (_.has(data, 'columns')) {
+      const { cols, columns, groups } = data;
+      return _.times(data.rowCount, (i) => {
+        let doc = {};
+        cols.forEach((col) => {
+          doc[col] = columns[col][i];
+        });
+        _.each(groups, (values, field) => {
+          doc[field] = values[doc[field]];
+        });
+        doc.index = i;
+        if (customMap !== false) doc = customMap(doc);
+        return doc;
+      });
+    }
+
     let { rows } = data;
     const { cols, groups } = data;
     if (isFlattened) {
@@ -18,4 +91,18 @@ class DataUtil {
     });
     return documents;
   }
+
+  // Load a .json or compact binary .bin data file; returns a promise that resolves with the data
+  static loadData(url) {
+    const promise = $.Deferred();
+    if (url.endsWith('.bin')) {
+      fetch(url)
+        .then((response) => response.arrayBuffer())
+        .then((buffer) => promise.resolve(DataUtil.decodeBinary(buffer)))
+        .catch((error) => promise.reject(error));
+    } else {
+      $.getJSON(url, (data) => promise.resolve(data)).fail((error) => promise.reject(error));
+    }
+    return promise;
+  }
 }
@@ -0,0 +1,65 @@
+// Loads documents from a data file that is either a single cols/rows/groups table
+// or a manifest of shards (see `writeShardedTable` in scripts/utilities.py), fetching only the shards that are needed
+class DocumentStore {
+  constructor(url, customMap = false, isFlattened = false) {
+    this.baseUrl = url.substring(0, url.lastIndexOf('/') + 1);
+    this.customMap = customMap;
+    this.isFlattened = isFlattened;
+    this.documents = [];
+    this.manifest = false;
+    this.shardPromises = {};
+    this.manifestPromise = DataUtil.loadData(url).then((data) => {
+      if (_.has(data, 'shards')) {
+        this.manifest = data;
+        this.shardStarts = data.shards.map((shard) => shard.start);
+      } else {
+        this.addDocuments(data, 0);
+      }
+      return this;
+    });
+  }
+
+  addDocuments(data, start) {
+    const documents = DataUtil.loadCollectionFromRows(data, false, this.isFlattened);
+    documents.forEach((doc) => {
+      let updatedDoc = doc;
+      updatedDoc.index = start + doc.index;
+      if (this.customMap !== false) updatedDoc = this.customMap(updatedDoc);
+      this.documents[updatedDoc.index] = updatedDoc;
+    });
+  }
+
+  // Returns a promise that resolves with the documents at the given indices, in the same order
+  get(indices) {
+    return this.manifestPromise.then(() => {
+      if (this.manifest === false) return indices.map((index) => this.documents[index]);
+      const shardIndices = _.uniq(indices.map((index) => _.sortedIndex(this.shardStarts, index + 1) - 1));
+      const shardPromises = shardIndices.map((shardIndex) => this.loadShard(shardIndex));
+      return $.when(...shardPromises).then(() => indices.map((index) => this.documents[index]));
+    });
+  }
+
+  // Returns a promise that resolves with every document; onProgress is called with the number of shards loaded so far and the total
+  getAll(onProgress = false) {
+    return this.manifestPromise.then(() => {
+      if (this.manifest === false) return this.documents;
+      const shardCount = this.manifest.shards.length;
+      let loadedCount = 0;
+      const shardPromises = _.times(shardCount, (shardIndex) => this.loadShard(shardIndex).then(() => {
+        loadedCount += 1;
+        if (onProgress !== false) onProgress(loadedCount, shardCount);
+      }));
+      return $.when(...shardPromises).then(() => this.documents);
+    });
+  }
+
+  loadShard(shardIndex) {
+    if (!_.has(this.shardPromises, shardIndex)) {
+      const shard = this.manifest.shards[shardIndex];
+      this.shardPromises[shardIndex] = DataUtil.loadData(`${this.baseUrl}${shard.file}`).then((data) => {
+        this.addDocuments(data, shard.start);
+      });
+    }
+    return this.shardPromises[shardIndex];
+  }
+}
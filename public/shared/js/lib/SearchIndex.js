@@ -0,0 +1,95 @@
+// Keyword search over a prebuilt index (see scripts/transcript_data_to_search_index.py)
+// Terms are sharded by prefix, so a search only fetches the shards for the words in the query
+class SearchIndex {
+  constructor(url) {
+    this.baseUrl = url.substring(0, url.lastIndexOf('/') + 1);
+    this.shardPromises = {};
+    this.manifestPromise = DataUtil.loadData(url).then((data) => {
+      this.manifest = data;
+      this.shardKeys = _.keys(data.shards);
+      return this;
+    });
+  }
+
+  // Decode base64 varint pairs of (gap from previous doc id, term count)
+  static decodePostings(encoded) {
+    const bytes = Uint8Array.from(atob(encoded), (c) => c.charCodeAt(0));
+    const postings = [];
+    let values = [];
+    let value = 0;
+    let shift = 0;
+    let docId = 0;
+    bytes.forEach((byte) => {
+      value += (byte & 0x7F) * (2 ** shift);
+      if (byte & 0x80) {
+        shift += 7;
+        return;
+      }
+      values.push(value);
+      value = 0;
+      shift = 0;
+      if (values.length === 2) {
+        docId += values[0];
+        postings.push([docId, values[1]]);
+        values = [];
+      }
+    });
+    return postings;
+  }
+
+  loadShard(key) {
+    if (!_.has(this.shardPromises, key)) {
+      this.shardPromises[key] = DataUtil.loadData(`${this.baseUrl}${this.manifest.shards[key]}`);
+    }
+    return this.shardPromises[key];
+  }
+
+  // Returns a promise that resolves with a map of doc id => score for docs with a term starting with `word`
+  matchWord(word) {
+    const { prefixLength, docCount } = this.manifest;
+    const keys = word.length >= prefixLength
+      ? _.intersection([word.substring(0, prefixLength)], this.shardKeys)
+      : this.shardKeys.filter((key) => key.startsWith(word));
+    const shardPromises = keys.map((key) => this.loadShard(key));
+    return $.when(...shardPromises).then((...shards) => {
+      const scores = {};
+      shards.forEach((shard) => {
+        // terms are sorted, so those that start with the word are in one run
+        let i = _.sortedIndex(shard.terms, word);
+        while (i < shard.terms.length && shard.terms[i].startsWith(word)) {
+          const idf = Math.log(1 + docCount / shard.docCounts[i]);
+          SearchIndex.decodePostings(shard.postings[i]).forEach(([docId, count]) => {
+            scores[docId] = (scores[docId] || 0) + count * idf;
+          });
+          i += 1;
+        }
+      });
+      return scores;
+    });
+  }
+
+  // Returns a promise that resolves with the ids of the docs that match every word of the query, best matches first
+  search(query, limit) {
+    const words = _.uniq(SearchIndex.tokenize(query));
+    return this.manifestPromise.then(() => {
+      if (words.length <= 0) return [];
+      const wordPromises = words.map((word) => this.matchWord(word));
+      return $.when(...wordPromises).then((...wordScores) => {
+        const [firstScores, ...otherScores] = _.sortBy(wordScores, (scores) => _.size(scores));
+        const results = [];
+        _.each(firstScores, (score, docId) => {
+          if (!otherScores.every((scores) => _.has(scores, docId))) return;
+          const total = otherScores.reduce((memo, scores) => memo + scores[docId], score);
+          results.push([parseInt(docId, 10), total]);
+        });
+        const sorted = _.sortBy(_.sortBy(results, (result) => result[0]), (result) => -result[1]);
+        return sorted.slice(0, limit).map((result) => result[0]);
+      });
+    });
+  }
+
+  // Same tokenizer as the exporter: lowercase runs of letters and numbers
+  static tokenize(text) {
+    return text.toLowerCase().match(/[\p{L}\p{N}]+/gu) || [];
+  }
+}
@@ -12,8 +12,6 @@ class App {
   }
 
   init() {
-    this.transcriptsLoaded = false;
-
     // parse templates
     _.templateSettings = {
       interpolate: /\{\{(.+?)\}\}/g,
@@ -26,18 +24,18 @@ class App {
     const timelineDataURL = `../data/${this.options.project}/timeline.json`;
     const timelineDataPromise = $.getJSON(timelineDataURL, (data) => data);
 
+    // documents are only loaded when they are viewed
     const transcriptDataURL = `../data/${this.options.project}/transcripts.json`;
-    const transcriptDataPromise = $.getJSON(transcriptDataURL, (data) => data);
-    this.transcriptDataPromise = $.Deferred();
+    this.documentStore = new DocumentStore(transcriptDataURL, (doc) => {
+      const updatedDoc = doc;
+      updatedDoc.id = doc.index;
+      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
+      return updatedDoc;
+    });
 
     $.when(timelineDataPromise).done((timelineData) => {
       this.onTimelineDataLoad(timelineData);
     });
-
-    $.when(transcriptDataPromise).done((transcriptData) => {
-      this.onTranscriptDataLoad(transcriptData);
-      this.transcriptDataPromise.resolve();
-    });
   }
 
   filterResults(year, subcollectionIndex) {
@@ -52,11 +50,7 @@ class App {
     this.$results.html('');
     this.$resultsContainer.addClass('active');
 
-    $.when(this.transcriptDataPromise).done(() => {
-      const docs = [];
-      docIndices.forEach((docIndex) => {
-        docs.push(this.documents[docIndex]);
-      });
+    this.documentStore.get(docIndices).done((docs) => {
       this.$resultsMessage.html(`Showing <strong>${count}</strong> results from <strong>${year}</strong> within <strong><em>"${title}"</em></strong>`);
       this.renderDocs(docs);
     });
@@ -94,17 +88,6 @@ class App {
     this.loadListeners();
   }
 
-  onTranscriptDataLoad(transcriptData) {
-    this.documents = DataUtil.loadCollectionFromRows(transcriptData, (doc) => {
-      const updatedDoc = doc;
-      updatedDoc.id = doc.index;
-      updatedDoc.itemUrl = `https://www.loc.gov/resource/${doc.ResourceID}/?sp=${doc.ItemAssetIndex}&st=text`;
-      return updatedDoc;
-    });
-    console.log('Transcript data loaded.');
-    this.transcriptsLoaded = true;
-  }
-
   renderDocs(docs, query = false) {
     let html = '';
     const { wordPad } = this.options;
@@ -24,15 +24,15 @@ def main(a):
     # Make sure output dirs exist
     makeDirectories(OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.INPUT_FILE)
-
-    for i, row in enumerate(rows):
-        rows[i]["Index"] = i
+    fieldnames, rows = iterCsv(a.INPUT_FILE)
 
     if "Index" not in fieldnames:
         fieldnames = ["Index"] + fieldnames
 
-    # Write data to file
-    writeCsv(OUTPUT_FILE, rows, fieldnames)
+    # Write data to file one row at a time
+    with CsvWriter(OUTPUT_FILE, fieldnames) as writer:
+        for i, row in enumerate(rows):
+            row["Index"] = i
+            writer.writerow(row)
 
 main(parseArgs())
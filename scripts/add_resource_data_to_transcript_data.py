@@ -28,11 +28,8 @@ def main(a):
         # Make sure output dirs exist
         makeDirectories(a.OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.TRANSCRIPT)
-
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        rows = filterByQueryString(rows, a.FILTER)
+    # Only the rows that match the filter (if any) are read
+    fieldnames, rows = readCsv(a.TRANSCRIPT, queryString=a.FILTER)
 
     # Load metadata into memory
     itemIds = unique([row["ItemId"] for row in rows])
@@ -0,0 +1,26 @@
+"""Script for writing a query index of a data file so filtered runs only read the rows they need"""
+
+# -*- coding: utf-8 -*-
+
+import argparse
+from utilities import *
+
+# Arguments
+def parseArgs():
+    """Function to parse script arguments"""
+
+    # pylint: disable=line-too-long
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A .csv (or columnar) data file")
+    parser.add_argument("-columns", dest="COLUMNS", default=",".join(QUERY_INDEX_COLUMNS), help="Comma-separated list of columns to index")
+    args = parser.parse_args()
+    return args
+
+def main(a):
+    """Main function to write a query index of a data file"""
+
+    columns = [column.strip() for column in a.COLUMNS.split(",")]
+    columns = [column for column in columns if len(column) > 0]
+    writeQueryIndex(a.INPUT_FILE, columns)
+
+main(parseArgs())
@@ -6,6 +6,7 @@ import argparse
 import spacy
 import spacy_fastlang
 
+from nlp_utilities import *
 from utilities import *
 
 # Arguments
@@ -16,6 +17,8 @@ def parseArgs():
     parser = argparse.ArgumentParser()
     parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file. You can download these via script `get_transcript_data.py`")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="", help="Output csv file; leave blank to update input file")
+    parser.add_argument("-workers", dest="WORKERS", default=1, type=int, help="Number of processes to parse transcripts with")
+    parser.add_argument("-batch", dest="BATCH_SIZE", default=32, type=int, help="Number of transcripts to parse per batch")
     args = parser.parse_args()
     return args
 
@@ -27,17 +30,24 @@ def main(a):
     # Make sure output dirs exist
     makeDirectories(OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.INPUT_FILE)
+    # Only read the transcripts from columnar files
+    columns = ["Transcription"] if isColumnarFile(a.INPUT_FILE) else None
+
+    fieldnames, rows = readCsv(a.INPUT_FILE, columns=columns)
     rowCount = len(rows)
-    nlp = spacy.load("en_core_web_lg")
+    # Language detection only looks at the text, so we don't need to parse it
+    nlp = spacy.blank("en")
     nlp.add_pipe("language_detector")
 
-    for i, row in enumerate(rows):
-        transcript = row["Transcription"]
-        doc = nlp(transcript)
-        rows[i]["lang"] = doc._.language
+    items = ((row["Transcription"], j) for j, row in enumerate(rows))
+    for i, (doc, rowIndex) in enumerate(pipeDocs(nlp, items, batchSize=a.BATCH_SIZE, workers=a.WORKERS)):
+        rows[rowIndex]["lang"] = doc._.language
         printProgress(i+1, rowCount, "Progress: ")
 
+    if columns is not None:
+        writeColumns(OUTPUT_FILE, rows, ["lang"], a.INPUT_FILE)
+        return
+
     if "lang" not in fieldnames:
         fieldnames += ["lang"]
 
@@ -4,7 +4,6 @@
 
 import argparse
 import os
-import time
 
 from utilities import *
 
@@ -17,7 +16,15 @@ def parseArgs():
     parser.add_argument("-in", dest="TRANSCRIPT", default="data/2021387726/resources/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20.csv", help="A BtP dataset file. You can download these via script `get_transcript_data.py`")
     parser.add_argument("-filter", dest="FILTER", default="AssetStatus=completed", help="Filter query string; leave blank if no filter")
     parser.add_argument("-out", dest="ITEM_DATA_DIR", default="data/items/", help="Output directory to store data files")
+    parser.add_argument("-url", dest="ITEM_URL", default="https://www.loc.gov/item/{itemId}/?fo=json", help="URL template of item metadata; change the host to test against a local server")
+    parser.add_argument("-workers", dest="WORKERS", default=4, type=int, help="Maximum number of requests to make at once")
+    parser.add_argument("-rate", dest="RATE", default=1.0, type=float, help="Maximum number of requests per second")
+    parser.add_argument("-burst", dest="BURST", default=1, type=int, help="Number of requests that can be made at once after a quiet period, within the -rate limit")
+    parser.add_argument("-retries", dest="RETRIES", default=5, type=int, help="Number of times to retry a request that fails with a connection error or a 429/5xx response")
+    parser.add_argument("-maxwait", dest="MAX_RETRY_AFTER", default=3600, type=float, help="Longest Retry-After (in seconds) to wait for; items whose server asks for longer fail right away")
     parser.add_argument("-overwrite", dest="OVERWRITE", action="store_true", help="Overwrite existing data?")
+    parser.add_argument("-refresh", dest="REFRESH", action="store_true", help="Check existing items for changes with conditional requests (using the ETag/Last-Modified of their last download) and only rewrite the ones that changed")
+    parser.add_argument("-validators", dest="VALIDATORS_FILE", default="", help="JSON file of the ETag/Last-Modified headers of each downloaded item; leave blank to use _validators.json in the output directory")
     parser.add_argument("-probe", dest="PROBE", action="store_true", help="Just output details; do not process data")
     args = parser.parse_args()
     return args
@@ -29,11 +36,8 @@ def main(a):
         # Make sure output dirs exist
         makeDirectories(a.ITEM_DATA_DIR)
 
-    fieldnames, rows = readCsv(a.TRANSCRIPT)
-
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        rows = filterByQueryString(rows, a.FILTER)
+    # Only the rows that match the filter (if any) are read
+    fieldnames, rows = readCsv(a.TRANSCRIPT, queryString=a.FILTER)
 
     itemIds = unique([row["ItemId"] for row in rows])
     itemCount = len(itemIds)
@@ -41,14 +45,66 @@ def main(a):
     if a.PROBE:
         return
 
-    # Download transcript resources from each url
-    for i, itemId in enumerate(itemIds):
-        url = f"https://www.loc.gov/item/{itemId}/?fo=json"
+    # ETag/Last-Modified headers of each item, for conditional requests when refreshing
+    validatorsFile = a.VALIDATORS_FILE if len(a.VALIDATORS_FILE) > 0 else f"{a.ITEM_DATA_DIR}_validators.json"
+    validators = readJSON(validatorsFile)
+
+    # Items that were already downloaded are skipped (unless refreshing), so an interrupted run can be resumed by running it again
+    tasks = []
+    for itemId in itemIds:
         filename = f"{a.ITEM_DATA_DIR}{itemId}.json"
-        if not os.path.isfile(filename) or a.OVERWRITE:
-            download(url, filename, overwrite=True, prependMessage=f"({i+1} of {itemCount}) ")
-            time.sleep(2) # sleep to avoid rate limiting
-        else:
-            print(f"({i+1} of {itemCount}) {filename} already exists")
+        if not os.path.isfile(filename) or a.OVERWRITE or a.REFRESH:
+            tasks.append((a.ITEM_URL.format(itemId=itemId), filename, itemId))
+    taskCount = len(tasks)
+    if a.REFRESH:
+        print(f"Checking {taskCount} items for changes")
+    else:
+        print(f"{itemCount - taskCount} items already downloaded; downloading {taskCount} items")
+
+    def getRequestHeaders(task):
+        url, filename, itemId = task
+        headers = {}
+        if a.REFRESH and os.path.isfile(filename) and itemId in validators:
+            if "ETag" in validators[itemId]:
+                headers["If-None-Match"] = validators[itemId]["ETag"]
+            if "Last-Modified" in validators[itemId]:
+                headers["If-Modified-Since"] = validators[itemId]["Last-Modified"]
+        return headers
+
+    # Download item data from each url
+    downloader = Downloader(rate=a.RATE, burst=a.BURST, workers=a.WORKERS, retries=a.RETRIES, maxRetryAfter=a.MAX_RETRY_AFTER)
+    failures = []
+    changedItemIds = []
+    results = downloader.downloadAll(tasks, getRequestHeaders)
+    try:
+        for i, (task, response, changed, error) in enumerate(results):
+            itemId = task[2]
+            if error is not None:
+                failures.append((itemId, error))
+            else:
+                if changed:
+                    changedItemIds.append(itemId)
+                itemValidators = {key: response.headers[key] for key in ("ETag", "Last-Modified") if key in response.headers}
+                if len(itemValidators) > 0:
+                    validators[itemId] = itemValidators
+            # Save validators as we go so they survive an interrupted run
+            if (i+1) % 100 == 0:
+                writeJSON(validatorsFile, validators, verbose=False)
+            printProgress(i+1, taskCount, "Downloading items... ")
+    finally:
+        # Cancel any downloads that are still queued (e.g. on Ctrl-C) and keep the validators found so far
+        results.close()
+        writeJSON(validatorsFile, validators, verbose=False)
+
+    if a.REFRESH:
+        print(f"\n{len(changedItemIds)} of {taskCount - len(failures)} items changed")
+        for itemId in sorted(changedItemIds):
+            print(f"  {itemId}")
+    else:
+        print(f"\nDownloaded {taskCount - len(failures)} items")
+    if len(failures) > 0:
+        print(f"{len(failures)} items failed; run again to retry them:")
+        for itemId, error in sorted(failures, key=lambda failure: failure[0]):
+            print(f"  {itemId}: {error}")
 
 main(parseArgs())
@@ -3,12 +3,19 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from collections import deque
+import itertools
 from pprint import pprint
 import re
 import spacy
+import time
 
+from nlp_utilities import *
 from utilities import *
 
+# Extra words allowed by the word count in isCandidate, since a token with letters can still be tagged as a symbol or punctuation and not count as a word in getSentences
+CANDIDATE_WORD_SLACK = 4
+
 # Arguments
 def parseArgs():
     """Function to parse script arguments"""
@@ -18,16 +25,21 @@ def parseArgs():
     parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file. You can download these via script `get_transcript_data.py`")
     parser.add_argument("-filter", dest="FILTER", default="lang=en AND Project IN LIST Family letters|Speeches and writings|Diaries and journals: 1888-1951", help="Filter query string; leave blank if no filter")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_prompts.csv", help="Output csv file")
+    parser.add_argument("-cache", dest="CACHE_DIR", default="data/cache/docs/", help="Directory of cached parsed docs shared by NLP scripts; leave blank to not use a cache")
+    parser.add_argument("-workers", dest="WORKERS", default=1, type=int, help="Number of processes to parse transcripts with")
+    parser.add_argument("-batch", dest="BATCH_SIZE", default=32, type=int, help="Number of transcripts to parse per batch")
+    parser.add_argument("-cascade", dest="CASCADE", action="store_true", help="Only run the parser and entity recognizer on transcripts with a sentence that could be a prompt, found with the sentence segmenter, lexical checks, and the tagger; does not use the doc cache")
+    parser.add_argument("-compare", dest="COMPARE", action="store_true", help="Run both the full and -cascade paths without the doc cache or verb cache file, and report whether their prompts are identical and how long each took; does not write output")
+    parser.add_argument("-verbs", dest="VERB_CACHE_FILE", default="data/cache/verb-tenses.json", help="File to persist the tenses of re-checked verbs to; leave blank to not persist")
+    parser.add_argument("-verbs-size", dest="VERB_CACHE_SIZE", default=10000, type=int, help="Maximum number of verbs to keep in the verb cache")
+    parser.add_argument("-prewarm", dest="PREWARM_FILE", default="", help="Optional text file with one verb per line to add to the verb cache before processing")
     parser.add_argument("-debug", dest="DEBUG", action="store_true", help="Debug?")
     args = parser.parse_args()
     return args
 
-def checkVerb(nlp, token):
-    """Test a verb by placing a You in front of it"""
-    testText = f"You {token.text.lower()}"
-    testDoc = nlp(testText)
-    testToken = testDoc[1]
-    return testToken
+def checkVerb(verbTenses, token):
+    """Test a verb by placing a You in front of it; returns the tense it is tagged with"""
+    return verbTenses.get(token.text)
 
 def getFirstValue(arr):
     """Get the first value of an array"""
@@ -36,7 +48,7 @@ def getFirstValue(arr):
         value = arr[0]
     return value
 
-def isImperative(nlp, span):
+def isImperative(verbTenses, span):
     """Check if a span of text is imperative"""
     value = None
     for i, token in enumerate(span):
@@ -62,8 +74,7 @@ def isImperative(nlp, span):
             # only include infinitive form of verbs
             if verbForm == "Inf":
                 # Put "You" in front on verb and double check if it is in present tense
-                testToken = checkVerb(nlp, token)
-                testTense = getFirstValue(testToken.morph.get("Tense"))
+                testTense = checkVerb(verbTenses, token)
                 if testTense == "Pres":
                     value = True
                 else:
@@ -86,6 +97,26 @@ def isImperative(nlp, span):
             break
     return value
 
+def isCandidate(sent, minWords=3, maxWords=24):
+    """Check with lexical attributes only if a sentence could be a prompt, before it is tagged or parsed.
+    Each check is looser than its counterpart in getSentences, so a sentence that getSentences would keep always passes"""
+    # the same start check as getSentences, on the same normalized text
+    text = normalizeText(sent.text)
+    if len(text) <= 0 or text[0].islower():
+        return False
+
+    # every word is a token, so a sentence with too few tokens has too few words
+    if len(sent) < minWords:
+        return False
+
+    # tokens with letters or digits that aren't numbers or spaces are usually words; getSentences skips sentences with numbers or unknown words anyway
+    wordCount = len([token for token in sent if not token.is_space and not token.like_num and any(c.isalnum() for c in token.text)])
+    return wordCount <= maxWords + CANDIDATE_WORD_SLACK
+
+def isCandidateToken(token):
+    """Check with the tagger's output only if a token could make its sentence a prompt: imperatives need a verb in its infinitive form (tagged VB) and questions need a question mark"""
+    return token.tag_ == "VB" or "Inf" in token.morph.get("VerbForm") or token.text == "?"
+
 def isQuestion(nlp, span):
     """Check if a span of text is a question"""
     value = None
@@ -136,9 +167,8 @@ def normalizeText(text):
     text = re.sub(r"[^a-zA-Z0-9\.!?]+$", "", text) # remove non-alpha and punct from end of string
     return text
 
-def getSentences(nlp, transcript, minWords=3, maxWords=24):
-    """Retrieve a list of sentences from a text"""
-    doc = nlp(transcript)
+def getSentences(nlp, doc, verbTenses, minWords=3, maxWords=24):
+    """Retrieve a list of sentences from a parsed text"""
     types=["imperative", "interrogative"]
     # types=["interrogative"]
     sents = list(doc.sents)
@@ -174,7 +204,7 @@ def getSentences(nlp, transcript, minWords=3, maxWords=24):
         # Retrieve sentence type and filter
         sentenceType = "unknown"
         for j, clause in enumerate(clauses):
-            isImperativeValue = isImperative(nlp, clause)
+            isImperativeValue = isImperative(verbTenses, clause)
             if isImperativeValue is True:
                 sentenceType = "imperative"
                 break
@@ -231,41 +261,113 @@ def getSentences(nlp, transcript, minWords=3, maxWords=24):
         #     print(f"{token.text}\tLEMMA:{token.lemma_}\tPOS:{token.pos_}\tTAG:{token.tag_}\tMORPH:${token.morph}\tSHAPE:{token.shape_}\tENT:{token.ent_type_}\tENT_PART:{token.ent_iob_}")
     return validSents
 
+def getPrompts(nlp, rows, verbTenses, cascade=False, cacheDir="", batchSize=32, workers=1):
+    """Retrieve the prompts of each row; with cascade, rows that could not have prompts are skipped before they are parsed, and the doc cache is not used"""
+    rowCount = len(rows)
+    items = ((row["Transcription"], j) for j, row in enumerate(rows))
+    if cascade:
+        docs = pipeCandidates(nlp, items, batchSize, workers)
+    else:
+        docs = pipeDocs(nlp, items, cacheDir, batchSize, workers)
+    sentences = []
+    for doc, rowIndex in docs:
+        row = rows[rowIndex]
+        rowSentences = getSentences(nlp, doc, verbTenses)
+        for j, sent in enumerate(rowSentences):
+            # print(sent["text"])
+            # print("----------------------------------")
+            rowSentences[j]["doc"] = row["Index"]
+            rowSentences[j]["ResourceURL"] = row["ResourceURL"]
+            rowSentences[j]["Project"] = row["Project"]
+            rowSentences[j]["EstimatedYear"] = row["EstimatedYear"]
+        sentences += rowSentences
+        printProgress(rowIndex+1, rowCount, "Progress: ")
+    return sentences
+
+def pipeCandidates(nlp, items, batchSize=32, workers=1, minWords=3, maxWords=24):
+    """Parse (text, rowIndex) tuples in stages, yielding (doc, rowIndex) tuples in order for only the texts that could have prompts.
+    Texts are split with the cheap sentence segmenter and skipped if no sentence passes isCandidate; the rest are tagged and skipped if none of those sentences has a token that passes isCandidateToken.
+    The rest of the pipeline then continues on the same tagged docs, so each kept text is parsed once, whole, and in the same order of pipes as a full run."""
+    if "senter" in nlp.component_names:
+        senter = nlp.get_pipe("senter")
+    else:
+        senter = nlp.add_pipe("sentencizer", name="cascade_sentencizer", last=True)
+        nlp.disable_pipe("cascade_sentencizer")
+
+    # the tagger pipes at the start of the pipeline run first; the parser, entity recognizer, etc. only run on texts that pass
+    taggerPipes = list(itertools.takewhile(lambda name: name in TAGGER_PIPES, nlp.pipe_names))
+    otherPipes = [name for name in nlp.pipe_names if name not in taggerPipes]
+
+    def getCandidates():
+        # the segmenter runs on separate docs so its sentence boundaries aren't passed on to the parser
+        rowIndices = deque()
+        def makeDocs():
+            for text, rowIndex in items:
+                rowIndices.append(rowIndex)
+                yield nlp.make_doc(text)
+        for doc in senter.pipe(makeDocs(), batch_size=batchSize):
+            rowIndex = rowIndices.popleft()
+            spans = [(sent.start, sent.end) for sent in doc.sents if isCandidate(sent, minWords, maxWords)]
+            if len(spans) > 0:
+                yield (doc.text, (rowIndex, spans))
+
+    def getTaggedCandidates():
+        docs = nlp.pipe(getCandidates(), as_tuples=True, disable=otherPipes, batch_size=batchSize, n_process=workers)
+        for doc, (rowIndex, spans) in docs:
+            if any(isCandidateToken(token) for start, end in spans for token in doc[start:end]):
+                yield (doc, rowIndex)
+
+    yield from nlp.pipe(getTaggedCandidates(), as_tuples=True, disable=taggerPipes, batch_size=batchSize, n_process=workers)
+
 def main(a):
     """Main function to perform natural language processing on transcript data"""
 
     # Make sure output dirs exist
     makeDirectories(a.OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.INPUT_FILE)
-
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        rows = filterByQueryString(rows, a.FILTER)
-
-    rowCount = len(rows)
+    # Only the rows that match the filter (if any) are read
+    fieldnames, rows = readCsv(a.INPUT_FILE, queryString=a.FILTER)
 
     nlp = spacy.load("en_core_web_lg")
 
     # transcript = ("White men are neither punished for "
     #                 "invading it, not lynched for violating"
     #                 "Colored women and girls.")
-    # rowSentences = getSentences(nlp, transcript)
+    # rowSentences = getSentences(nlp, nlp(transcript), verbTenses)
 
     # Retrieve resource data for each row
-    sentences = []
-    for i, row in enumerate(rows):
-        transcript = row["Transcription"]
-        rowSentences = getSentences(nlp, transcript)
-        for j, sent in enumerate(rowSentences):
-            # print(sent["text"])
-            # print("----------------------------------")
-            rowSentences[j]["doc"] = row["Index"]
-            rowSentences[j]["ResourceURL"] = row["ResourceURL"]
-            rowSentences[j]["Project"] = row["Project"]
-            rowSentences[j]["EstimatedYear"] = row["EstimatedYear"]
-        sentences += rowSentences
-        printProgress(i+1, rowCount, "Progress: ")
+    if a.COMPARE:
+        # Neither path uses the doc cache, and each starts with an empty verb cache, so the timings are comparable
+        startTime = time.time()
+        fullSentences = getPrompts(nlp, rows, VerbTenseCache(nlp, "", a.VERB_CACHE_SIZE), False, "", a.BATCH_SIZE, a.WORKERS)
+        fullSeconds = time.time() - startTime
+        startTime = time.time()
+        cascadeSentences = getPrompts(nlp, rows, VerbTenseCache(nlp, "", a.VERB_CACHE_SIZE), True, "", a.BATCH_SIZE, a.WORKERS)
+        cascadeSeconds = time.time() - startTime
+        toKeys = lambda sentences: [(s["doc"], s["type"], s["text"]) for s in sentences]
+        fullKeys = toKeys(fullSentences)
+        cascadeKeys = toKeys(cascadeSentences)
+        print(f"\nFull: {len(fullKeys)} prompts in {round(fullSeconds, 1)}s")
+        print(f"Cascade: {len(cascadeKeys)} prompts in {round(cascadeSeconds, 1)}s ({round(fullSeconds / max(cascadeSeconds, 0.001), 2)}x faster)")
+        if fullKeys == cascadeKeys:
+            print("Prompts are identical")
+        else:
+            print("Prompts differ:")
+            for key in sorted(set(fullKeys) - set(cascadeKeys)):
+                print(f"  Only in full: {key}")
+            for key in sorted(set(cascadeKeys) - set(fullKeys)):
+                print(f"  Only in cascade: {key}")
+        return
+
+    verbTenses = VerbTenseCache(nlp, a.VERB_CACHE_FILE, a.VERB_CACHE_SIZE)
+    if len(a.PREWARM_FILE) > 0:
+        verbCount = verbTenses.prewarm(readText(a.PREWARM_FILE, lines=True))
+        print(f"Added {verbCount} verbs to the verb cache")
+
+    sentences = getPrompts(nlp, rows, verbTenses, a.CASCADE, a.CACHE_DIR, a.BATCH_SIZE, a.WORKERS)
+
+    verbTenses.save()
+    print(f"Verb cache: {verbTenses.hits} hits, {verbTenses.misses} misses")
 
     if a.DEBUG:
         return
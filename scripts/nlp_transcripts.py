@@ -3,8 +3,11 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import numpy as np
+from scipy import sparse
 import spacy
 
+from nlp_utilities import *
 from utilities import *
 
 # Arguments
@@ -15,7 +18,10 @@ def parseArgs():
     parser = argparse.ArgumentParser()
     parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20.csv", help="A BtP dataset file. You can download these via script `get_transcript_data.py`")
     parser.add_argument("-filter", dest="FILTER", default="", help="Filter query string; leave blank if no filter")
-    parser.add_argument("-out", dest="OUTPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_lemmas.csv", help="Output csv file")
+    parser.add_argument("-out", dest="OUTPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_lemmas.csv", help="Output csv file; a lemma x document count matrix is also written next to it as .npz")
+    parser.add_argument("-cache", dest="CACHE_DIR", default="data/cache/docs/", help="Directory of cached parsed docs shared by NLP scripts; leave blank to not use a cache")
+    parser.add_argument("-workers", dest="WORKERS", default=1, type=int, help="Number of processes to parse transcripts with")
+    parser.add_argument("-batch", dest="BATCH_SIZE", default=32, type=int, help="Number of transcripts to parse per batch")
     parser.add_argument("-debug", dest="DEBUG", action="store_true", help="Debug?")
     args = parser.parse_args()
     return args
@@ -34,57 +40,64 @@ def main(a):
         rows = filterByQueryString(rows, a.FILTER)
 
     lemmas = []
-    lemmaIndex = []
+    lemmaIndex = {}
+    matrixRows = []
+    matrixCols = []
+    matrixCounts = []
     nlp = spacy.load("en_core_web_lg")
     
+    # Use a sample transcript when debugging
+    items = ((row["Transcription"], j) for j, row in enumerate(rows))
+    cacheDir = a.CACHE_DIR
+    if a.DEBUG:
+        transcript = ("Saturday,  Sept.  23,  1905 "
+                        "Today is my birthday "
+                        "Phyllis and I arose before "
+                        "breakfast and went to Takoma  "
+                        "Park to get eggs and "
+                        "golden rod. Mrs. Brown "
+                        "from whom we usually "
+                        "buy eggs was not home. "
+                        "Then we gathered golden "
+                        "rod and came home for "
+                        "breakfast. I ripped some for "
+                        "Addie the seamstress who "
+                        "is sewing here and then I began  "
+                        "to write on my address. "
+                        "After dinner I walked "
+                        "down town bought some "
+                        "gilt braid to put on P's red "
+                        "coat and a basket of grapes. "
+                        "Detective Lacey has been suspended "
+                        "from the police force. "
+                        "       Sunday,  Sept.  24,  1905 "
+                        "Read the papers, wrote "
+                        "some, went with Phyllis "
+                        "and Mr. Terrell to call on "
+                        "Dr. Langston and his "
+                        "French wife from Hayte. "
+                        "Spoke French Phyllis looked "
+                        "beautiful in new white "
+                        "dress I designed. Spoke at "
+                        "People's Church for Prof. Moore "
+                        "in evening on Club work of "
+                        "Colored Women and was "
+                        "really deeply affected, when I "
+                        "spoke of sacrifices made by "
+                        "Col women who are forced to "
+                        "leave home to do public "
+                        "work. Went from there to True "
+                        "Reformers Hall to attend service "
+                        "of a new sect- The Church of God "
+                        "and Saints of Christ founded by "
+                        "Colored man ten years ago now "
+                        "has 60000 followers. His name is Crowdy")
+        items = [(transcript, 0)]
+        cacheDir = ""
+
     # Retrieve resource data for each row
-    for i, row in enumerate(rows):
-        transcript = row["Transcription"]
-        if a.DEBUG:
-            transcript = ("Saturday,  Sept.  23,  1905 "
-                            "Today is my birthday "
-                            "Phyllis and I arose before "
-                            "breakfast and went to Takoma  "
-                            "Park to get eggs and "
-                            "golden rod. Mrs. Brown "
-                            "from whom we usually "
-                            "buy eggs was not home. "
-                            "Then we gathered golden "
-                            "rod and came home for "
-                            "breakfast. I ripped some for "
-                            "Addie the seamstress who "
-                            "is sewing here and then I began  "
-                            "to write on my address. "
-                            "After dinner I walked "
-                            "down town bought some "
-                            "gilt braid to put on P's red "
-                            "coat and a basket of grapes. "
-                            "Detective Lacey has been suspended "
-                            "from the police force. "
-                            "       Sunday,  Sept.  24,  1905 "
-                            "Read the papers, wrote "
-                            "some, went with Phyllis "
-                            "and Mr. Terrell to call on "
-                            "Dr. Langston and his "
-                            "French wife from Hayte. "
-                            "Spoke French Phyllis looked "
-                            "beautiful in new white "
-                            "dress I designed. Spoke at "
-                            "People's Church for Prof. Moore "
-                            "in evening on Club work of "
-                            "Colored Women and was "
-                            "really deeply affected, when I "
-                            "spoke of sacrifices made by "
-                            "Col women who are forced to "
-                            "leave home to do public "
-                            "work. Went from there to True "
-                            "Reformers Hall to attend service "
-                            "of a new sect- The Church of God "
-                            "and Saints of Christ founded by "
-                            "Colored man ten years ago now "
-                            "has 60000 followers. His name is Crowdy") 
-        
-        doc = nlp(transcript)
+    for i, (doc, rowIndex) in enumerate(pipeDocs(nlp, items, cacheDir, a.BATCH_SIZE, a.WORKERS)):
+        row = rows[rowIndex]
         tokenCount = len(doc)
         docLemmas = []
         for j, token in enumerate(doc):
@@ -162,26 +175,29 @@ def main(a):
                 docLemmas.pop(index)
 
         # add document lemmas to overall list
+        docCounts = {}
         for dlemma in docLemmas:
             lemma = dlemma["lemma"]
             # check to see if lemma exists in our index
             lookupLemma = lemma.lower()
-            index = len(lemmaIndex)
-            if lookupLemma in lemmaIndex:
-                index = lemmaIndex.index(lookupLemma)
-            else:
-                lemmaIndex.append(lookupLemma)
+            index = lemmaIndex.get(lookupLemma)
+            if index is None:
+                index = len(lemmas)
+                lemmaIndex[lookupLemma] = index
                 lemmas.append({
                     "lemma": lemma,
                     "pos": dlemma["pos"],
                     "ent": dlemma["ent"],
                     "sentiment": dlemma["sentiment"],
-                    "count": 0,
-                    "docs": []
+                    "count": 0
                 })
             lemmas[index]["count"] += 1
-            if row["Index"] not in lemmas[index]["docs"]:
-                lemmas[index]["docs"].append(row["Index"])
+            docCounts[index] = docCounts.get(index, 0) + 1
+        docIndex = int(row["Index"])
+        for index, count in docCounts.items():
+            matrixRows.append(index)
+            matrixCols.append(docIndex)
+            matrixCounts.append(count)
         printProgress(i+1, rowCount, "Progress: ")
         if a.DEBUG:
             break
@@ -190,13 +206,22 @@ def main(a):
         # pprint(lemmas)
         return
     
-    # convert list to string and sort by count
+    # sort by count; rows of the matrix follow the same order as the lemma table
+    order = sorted(range(len(lemmas)), key=lambda i: -lemmas[i]["count"])
+    lemmas = [lemmas[i] for i in order]
+    docCount = max([int(row["Index"]) for row in rows], default=-1) + 1
+    matrix = sparse.csr_matrix((np.array(matrixCounts, dtype=np.int32), (np.array(matrixRows, dtype=np.int32), np.array(matrixCols, dtype=np.int32))), shape=(len(order), docCount))
+    rowOrder = np.array(order, dtype=np.int64)
+    matrix = matrix[rowOrder] if len(order) > 0 else matrix
+    matrix.sort_indices()
     for i, lemma in enumerate(lemmas):
-        lemmas[i]["docs"] = ";".join(lemma["docs"])
-    lemmas = sorted(lemmas, key=lambda k: -k["count"])
+        lemmas[i]["docCount"] = int(matrix.indptr[i+1] - matrix.indptr[i])
 
     # Write data to file
-    fielnamesOut = ["lemma", "pos", "ent", "count", "sentiment", "docs"]
+    fielnamesOut = ["lemma", "pos", "ent", "count", "sentiment", "docCount"]
     writeCsv(a.OUTPUT_FILE, lemmas, fielnamesOut)
+    matrixFile = replaceExtension(a.OUTPUT_FILE, ".npz")
+    sparse.save_npz(matrixFile, matrix)
+    print(f"Wrote {matrix.shape[0]} x {matrix.shape[1]} lemma document matrix to {matrixFile}")
 
 main(parseArgs())
@@ -0,0 +1,200 @@
+"""Utility functions to support natural language processing scripts"""
+
+import glob
+import hashlib
+import itertools
+import os
+import time
+from collections import OrderedDict
+
+from spacy.tokens import DocBin
+
+from utilities import makeDirectories, readJSON, writeJSON
+
+# Pipeline components needed to tag tokens with part-of-speech and morphology
+TAGGER_PIPES = ("tok2vec", "tagger", "morphologizer", "attribute_ruler")
+
+# Number of texts pipeDocs reads at a time when using the doc cache; each chunk starts its own worker processes, so it should be much larger than a batch
+PIPE_CHUNK_SIZE = 5000
+
+class DocCache:
+    """A persistent cache of parsed spaCy Docs, stored as DocBin shards and keyed by the hash of a text.
+    Each model (and set of pipeline components) gets its own directory, and each shard has a .json file listing the hashes of its docs in order."""
+
+    def __init__(self, cacheDir, nlp, shardSize=1000, maxLoadedShards=2):
+        self.dir = os.path.join(cacheDir, getModelKey(nlp), "")
+        self.nlp = nlp
+        self.shardSize = shardSize
+        self.maxLoadedShards = maxLoadedShards
+        self.index = {}
+        self.loadedShards = OrderedDict()
+        self.pendingDocs = DocBin()
+        self.pendingHashes = []
+        self.pendingHashSet = set()
+        if not os.path.exists(self.dir):
+            os.makedirs(self.dir)
+        # Only shards whose list of hashes has been written are complete
+        for filename in sorted(glob.glob(f"{self.dir}*.json")):
+            shardName = os.path.splitext(os.path.basename(filename))[0]
+            for position, textHash in enumerate(readJSON(filename)):
+                self.index[textHash] = (shardName, position)
+
+    def __contains__(self, textHash):
+        return textHash in self.index
+
+    def add(self, textHash, doc):
+        """Add a parsed doc to the cache; docs are written to disk once there are enough to fill a shard"""
+        if textHash in self.index or textHash in self.pendingHashSet:
+            return
+        self.pendingDocs.add(doc)
+        self.pendingHashes.append(textHash)
+        self.pendingHashSet.add(textHash)
+        if len(self.pendingHashes) >= self.shardSize:
+            self.flush()
+
+    def flush(self):
+        """Write any pending docs to a new shard"""
+        if len(self.pendingHashes) <= 0:
+            return
+        shardName = f"shard-{time.time_ns()}-{os.getpid()}"
+        self.pendingDocs.to_disk(f"{self.dir}{shardName}.spacy")
+        writeJSON(f"{self.dir}{shardName}.json", self.pendingHashes, verbose=False)
+        for position, textHash in enumerate(self.pendingHashes):
+            self.index[textHash] = (shardName, position)
+        self.pendingDocs = DocBin()
+        self.pendingHashes = []
+        self.pendingHashSet = set()
+
+    def get(self, textHash):
+        """Retrieve a doc by the hash of its text; returns None if it is not cached"""
+        if textHash not in self.index:
+            return None
+        shardName, position = self.index[textHash]
+        if shardName in self.loadedShards:
+            self.loadedShards.move_to_end(shardName)
+        else:
+            # Keep the most recently used shards loaded
+            if len(self.loadedShards) >= self.maxLoadedShards:
+                self.loadedShards.popitem(last=False)
+            docBin = DocBin().from_disk(f"{self.dir}{shardName}.spacy")
+            self.loadedShards[shardName] = list(docBin.get_docs(self.nlp.vocab))
+        return self.loadedShards[shardName][position]
+
+def cacheDocs(nlp, texts, cacheDir, batchSize=32, workers=1, cache=None):
+    """Function to parse any texts that are not in the doc cache yet and add them to the cache.
+    An already open cache can be passed in to avoid reading its index again; returns the cache and the number of texts that were parsed"""
+    if cache is None:
+        cache = DocCache(cacheDir, nlp)
+    misses = {}
+    for text in texts:
+        textHash = getTextHash(text)
+        if textHash not in cache and textHash not in misses:
+            misses[textHash] = text
+    items = ((text, textHash) for textHash, text in misses.items())
+    try:
+        for doc, textHash in nlp.pipe(items, as_tuples=True, batch_size=batchSize, n_process=workers):
+            cache.add(textHash, doc)
+    finally:
+        cache.flush()
+    return cache, len(misses)
+
+def getModelKey(nlp):
+    """Function to return a key that identifies a model, its version, and its enabled pipeline components"""
+    meta = nlp.meta
+    pipesHash = hashlib.sha1(",".join(nlp.pipe_names).encode("utf8")).hexdigest()[:8]
+    return f"{meta['lang']}_{meta['name']}-{meta['version']}_{pipesHash}"
+
+def getTextHash(text):
+    """Function to return the hash of a text for looking it up in a cache"""
+    return hashlib.sha1(text.encode("utf8")).hexdigest()
+
+def pipeDocs(nlp, items, cacheDir="", batchSize=32, workers=1, verbose=True, chunkSize=PIPE_CHUNK_SIZE):
+    """Function to parse a list of (text, context) tuples in batches across one or more processes, yielding (doc, context) tuples in the same order.
+    Contexts are copied between processes when using more than one worker, so keep them small (e.g. a row index).
+    If a cache directory is given, items are read in chunks, only texts that are not cached yet are parsed, and docs are read from the cache."""
+    if len(cacheDir) <= 0:
+        yield from nlp.pipe(items, as_tuples=True, batch_size=batchSize, n_process=workers)
+        return
+
+    cache = None
+    parsedCount = 0
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, chunkSize))
+        if len(chunk) <= 0:
+            break
+        cache, chunkParsedCount = cacheDocs(nlp, (text for text, context in chunk), cacheDir, batchSize, workers, cache)
+        parsedCount += chunkParsedCount
+        for text, context in chunk:
+            yield (cache.get(getTextHash(text)), context)
+    if verbose:
+        print(f"Parsed {parsedCount} texts that were not in the cache")
+
+class VerbTenseCache:
+    """A bounded, least-recently-used cache of the tense spaCy assigns to a verb when "You" is placed in front of it.
+    Verbs are tagged with a tagger-only subset of the model's pipeline, and the cache can be saved to a .json file keyed by the model."""
+
+    def __init__(self, nlp, filename="", maxSize=10000):
+        self.nlp = nlp
+        self.filename = filename
+        self.maxSize = maxSize
+        self.modelKey = getModelKey(nlp)
+        self.pipes = [(name, proc) for name, proc in nlp.pipeline if name in TAGGER_PIPES]
+        self.tenses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if len(filename) > 0:
+            data = readJSON(filename)
+            # Only re-use tenses that were found with the same model
+            if data.get("model") == self.modelKey:
+                for verb, tense in data.get("tenses", {}).items():
+                    self.set(verb, tense)
+
+    def get(self, verb):
+        """Return the tense of a verb, tagging it if it is not cached"""
+        verb = verb.lower()
+        if verb in self.tenses:
+            self.hits += 1
+            self.tenses.move_to_end(verb)
+            return self.tenses[verb]
+        self.misses += 1
+        tense = getTense(self.tag(f"You {verb}")[1])
+        self.set(verb, tense)
+        return tense
+
+    def prewarm(self, verbs, batchSize=256):
+        """Tag a list of verbs in batches and add any that are not cached yet"""
+        verbs = list(OrderedDict.fromkeys(verb.strip().lower() for verb in verbs if len(verb.strip()) > 0))
+        verbs = [verb for verb in verbs if verb not in self.tenses]
+        docs = (self.nlp.make_doc(f"You {verb}") for verb in verbs)
+        for _name, proc in self.pipes:
+            docs = proc.pipe(docs, batch_size=batchSize)
+        for verb, doc in zip(verbs, docs):
+            self.set(verb, getTense(doc[1]))
+        return len(verbs)
+
+    def save(self):
+        """Write the cache to file if a filename was given"""
+        if len(self.filename) <= 0:
+            return
+        makeDirectories(self.filename)
+        writeJSON(self.filename, {"model": self.modelKey, "tenses": dict(self.tenses)}, verbose=False)
+
+    def set(self, verb, tense):
+        """Add a verb's tense, evicting the least recently used verb if the cache is full"""
+        self.tenses[verb] = tense
+        self.tenses.move_to_end(verb)
+        while len(self.tenses) > self.maxSize:
+            self.tenses.popitem(last=False)
+
+    def tag(self, text):
+        """Run only the tagging components of the pipeline over a text"""
+        doc = self.nlp.make_doc(text)
+        for _name, proc in self.pipes:
+            doc = proc(doc)
+        return doc
+
+def getTense(token):
+    """Function to return the first Tense morph feature of a token, or "None" if it has none"""
+    tenses = token.morph.get("Tense")
+    return tenses[0] if len(tenses) > 0 else "None"
@@ -3,10 +3,31 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import heapq
+import multiprocessing
+import signal
+import time
 from dateparser.search import search_dates
 
 from utilities import *
 
+# Dates need a year (see DATE_SETTINGS), so they can only be found near a 4-digit number, a numeric date like 3/25/06, or a month name followed by a number
+MONTH_PATTERN = r"jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec"
+DATE_CANDIDATE_PATTERN = re.compile(rf"\b(?:\d{{4}}|\d{{1,2}}[/.-]\d{{1,2}}[/.-]\d{{2,4}})\b|\b(?:{MONTH_PATTERN})[a-z]*\.?,?\s*\d{{1,2}}\b", re.IGNORECASE)
+
+# The matched text of a date is checked for a day (e.g. 3/25/1906, March 1st, 1 Mar.) or a month (e.g. March 1906, 3/1906) to tell how precise it is
+DATE_DAY_PATTERN = re.compile(rf"\b\d{{1,2}}[/.-]\d{{1,2}}[/.-]\d{{2,4}}\b|\b\d{{4}}-\d{{1,2}}-\d{{1,2}}\b|\b(?:{MONTH_PATTERN})[a-z]*\.?,?\s*\d{{1,2}}(?!\d)|\b\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?(?:{MONTH_PATTERN})", re.IGNORECASE)
+DATE_MONTH_PATTERN = re.compile(rf"\b(?:{MONTH_PATTERN})[a-z]*\b|\b\d{{1,2}}[/.-]\d{{4}}\b|\b\d{{4}}-\d{{1,2}}\b", re.IGNORECASE)
+
+# Written to TranscriptDates for rows whose search took longer than -timeout; later steps parse it as no date
+TIMEOUT_MARKER = "[timeout]"
+
+class RowTimeout(Exception):
+    """Raised when searching a row for dates takes longer than its time budget"""
+
 # Arguments
 def parseArgs():
     """Function to parse script arguments"""
@@ -16,10 +37,121 @@ def parseArgs():
     parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20.csv", help="A BtP dataset file. You can download these via script `get_transcript_data.py`")
     parser.add_argument("-filter", dest="FILTER", default="", help="Filter query string; leave blank if no filter")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="Output csv file; leave blank to update input file")
+    parser.add_argument("-scan", dest="SCAN", default="pages", choices=["windows", "pages", "off"], help="windows: only search the text around date-like spans; pages: search the full text of pages that have date-like spans; off: search the full text of every page")
+    parser.add_argument("-window", dest="WINDOW", default=40, type=int, help="Number of characters around each date-like span to search when -scan is windows")
+    parser.add_argument("-workers", dest="WORKERS", default=1, type=int, help="Number of processes to search transcripts with; rows are still written in order")
+    parser.add_argument("-batch", dest="BATCH_SIZE", default=16, type=int, help="Number of rows to send to a worker process at a time when -workers is more than 1")
+    parser.add_argument("-timeout", dest="TIMEOUT", default=60, type=float, help="Seconds a row can be searched for before it is given up on and marked as [timeout]; 0 for no limit")
+    parser.add_argument("-slowest", dest="SLOWEST", default=10, type=int, help="Number of slowest rows to report at the end")
     parser.add_argument("-probe", dest="PROBE", action="store_true", help="Just output details; do not process data")
     args = parser.parse_args()
     return args
 
+def getBatchTranscriptDates(tasks, scan="pages", padding=40, timeout=0):
+    """Function to find the dates in a batch of (transcript, start date, end date) tuples; run in worker processes"""
+    return [getTranscriptDates(transcript, startDate, endDate, scan, padding, timeout) for transcript, startDate, endDate in tasks]
+
+def getCandidateWindows(text, padding=40):
+    """Function to get the parts of a text around date-like spans, widened to whole words and merged where they overlap"""
+    windows = []
+    for match in DATE_CANDIDATE_PATTERN.finditer(text):
+        start = max(0, match.start() - padding)
+        end = min(len(text), match.end() + padding)
+        while start > 0 and not text[start-1].isspace():
+            start -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        if len(windows) > 0 and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return [text[start:end] for start, end in windows]
+
+def getDatePrecision(text):
+    """Function to guess whether the text of a date gives its year, month, or day; the parsed date can't be relied on since dateparser fills in missing parts from the current date"""
+    if DATE_DAY_PATTERN.search(text):
+        return "day"
+    if DATE_MONTH_PATTERN.search(text):
+        return "month"
+    return "year"
+
+def getTranscriptDates(transcript, startDate, endDate, scan="pages", padding=40, timeout=0):
+    """Function to find the dates in a transcript that fall within a date range. Returns the matched text joined by " | ", the matched dates as ISO dates (see formatPartialDate) joined by " | ", the number of seconds it took, and a status of ok, skipped, error, or timeout"""
+    startTime = time.perf_counter()
+    if scan != "off" and DATE_CANDIDATE_PATTERN.search(transcript) is None:
+        return ("", "", time.perf_counter() - startTime, "skipped")
+
+    # The alarm interrupts dateparser mid-search; it is only available on Unix-like systems and in the main thread
+    useAlarm = timeout > 0 and hasattr(signal, "SIGALRM")
+    if useAlarm:
+        signal.signal(signal.SIGALRM, onRowTimeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        parsedDates = searchDates(transcript, scan, padding)
+    except RowTimeout:
+        return (TIMEOUT_MARKER, "", time.perf_counter() - startTime, "timeout")
+    except Exception:
+        return ("", "", time.perf_counter() - startTime, "error")
+    finally:
+        if useAlarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    transcriptDates = []
+    isoDates = []
+    for parsedText, parsedDate in parsedDates:
+        parsedDate = parsedDate.replace(tzinfo=None)
+        if startDate is None or endDate is None or startDate <= parsedDate <= endDate:
+            transcriptDates.append(parsedText)
+            isoDates.append(formatPartialDate(parsedDate, getDatePrecision(parsedText)))
+    return (" | ".join(transcriptDates), " | ".join(isoDates), time.perf_counter() - startTime, "ok")
+
+def iterTranscriptDates(rows, scan="pages", padding=40, timeout=0, workers=1, batchSize=16):
+    """Function to yield each row with the result of getTranscriptDates for it, in order. With more than one worker, batches of rows are searched in worker processes"""
+    def getTask(row):
+        # Metadata dates are parsed here so their cache stays in this process
+        startDate, endDate = getDateRange(row["Dates"])
+        return (row["Transcription"], startDate, endDate)
+
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        # Scripts run main() on import, so worker processes must be forked rather than spawned
+        print("Worker processes are not supported on this system; using one process")
+        workers = 1
+    if workers <= 1:
+        for row in rows:
+            yield (row, getTranscriptDates(*getTask(row), scan, padding, timeout))
+        return
+
+    # Load dateparser's language data before forking so workers share it instead of each loading their own
+    searchDates("January 1, 1900", "off")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+        # Keep a few batches per worker in flight and collect them in the order they were sent, so rows are streamed in order
+        pending = deque()
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, batchSize))
+            if len(batch) > 0:
+                future = executor.submit(getBatchTranscriptDates, [getTask(row) for row in batch], scan, padding, timeout)
+                pending.append((batch, future))
+            if len(pending) <= 0:
+                break
+            if len(batch) <= 0 or len(pending) >= workers * 4:
+                batch, future = pending.popleft()
+                yield from zip(batch, future.result())
+
+def onRowTimeout(signum, frame):
+    """Function to handle the alarm set for a row's time budget"""
+    raise RowTimeout()
+
+def searchDates(text, scan="pages", padding=40):
+    """Function to find dates in a text; with scan set to windows, only the parts with something date-like in them are searched.
+    Pages with nothing date-like in them are skipped by getTranscriptDates before this is called"""
+    if scan != "windows":
+        return search_dates(text, settings=DATE_SETTINGS) or []
+    parsedDates = []
+    for window in getCandidateWindows(text, padding):
+        parsedDates += search_dates(window, settings=DATE_SETTINGS) or []
+    return parsedDates
+
 def main(a):
     """Main function to parse and add dates to transcript data"""
 
@@ -28,41 +160,45 @@ def main(a):
         # Make sure output dirs exist
         makeDirectories(OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.INPUT_FILE)
-    rowCount = len(rows)
-
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        rows = filterByQueryString(rows, a.FILTER)
-    
-    # Retrieve resource data for each row
-    for i, row in enumerate(rows):
-        transcriptDates = []
-        startDate, endDate = getDateRange(row["Dates"])
-        transcript = row["Transcription"]
-        parsedDates = None
-        try:
-            parsedDates = search_dates(transcript, settings={'REQUIRE_PARTS': ['year'], 'PREFER_DAY_OF_MONTH': 'first'})
-        except Exception:
-            print(f"Error with parsing row {i+1}; skipping")
-        if parsedDates is not None:
-            for parsedText, parsedDate in parsedDates:
-                parsedDate = parsedDate.replace(tzinfo=None)
-                if startDate is None or endDate is None or startDate <= parsedDate <= endDate:
-                    transcriptDates.append(parsedText)
-        rows[i]["TranscriptDates"] = " | ".join(transcriptDates)
-        printProgress(i+1, rowCount, "Progress: ")
-
-    if a.PROBE:
-        return
+    # Only the rows that match the filter (if any) are read
+    fieldnames, rows = iterCsv(a.INPUT_FILE, queryString=a.FILTER)
 
     # Add fields to new data
-    fieldsToAdd = ["TranscriptDates"]
+    fieldsToAdd = ["TranscriptDates", "TranscriptDatesISO"]
     for field in fieldsToAdd:
         if field not in fieldnames:
             fieldnames.append(field)
 
-    # Write data to file
-    writeCsv(OUTPUT_FILE, rows, fieldnames)
+    # Write data to file one row at a time; the output is left untouched if anything fails before the end
+    with CsvWriter(OUTPUT_FILE, fieldnames) if not a.PROBE else nullcontext() as writer:
+        # Retrieve resource data for each row
+        statusCounts = Counter()
+        slowestRows = []
+        results = iterTranscriptDates(rows, a.SCAN, a.WINDOW, a.TIMEOUT, a.WORKERS, a.BATCH_SIZE)
+        for i, (row, (transcriptDates, isoDates, seconds, status)) in enumerate(results):
+            if status == "error":
+                print(f"Error with parsing row {i+1}; skipping")
+            elif status == "timeout":
+                print(f"Parsing row {i+1} took longer than {a.TIMEOUT}s; marked as {TIMEOUT_MARKER}")
+            statusCounts[status] += 1
+            # Keep a min-heap of the slowest rows
+            slowRow = (seconds, i+1, row.get("ResourceID", ""), row.get("ItemAssetIndex", ""))
+            if len(slowestRows) < a.SLOWEST:
+                heapq.heappush(slowestRows, slowRow)
+            elif len(slowestRows) > 0 and slowRow > slowestRows[0]:
+                heapq.heapreplace(slowestRows, slowRow)
+            row["TranscriptDates"] = transcriptDates
+            row["TranscriptDatesISO"] = isoDates
+            if writer is not None:
+                writer.writerow(row)
+            printProgress(i+1, None, "Rows processed: ")
+
+    print(f"\nSkipped {statusCounts['skipped']} rows with nothing date-like in their transcripts")
+    print(f"{statusCounts['timeout']} rows timed out and {statusCounts['error']} rows had errors")
+    print(f"Metadata dates: {dateParseCounts['fast']} read directly, {dateParseCounts['fallback']} parsed with dateparser")
+    if len(slowestRows) > 0:
+        print("Slowest rows:")
+        for seconds, rowNumber, resourceId, assetIndex in sorted(slowestRows, reverse=True):
+            print(f"  Row {rowNumber} ({resourceId} page {assetIndex}): {round(seconds, 2)}s")
 
 main(parseArgs())
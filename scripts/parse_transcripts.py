@@ -0,0 +1,37 @@
+"""Script for parsing transcripts once and caching the parsed docs for other NLP scripts"""
+
+# -*- coding: utf-8 -*-
+
+import argparse
+import spacy
+
+from nlp_utilities import *
+from utilities import *
+
+# Arguments
+def parseArgs():
+    """Function to parse script arguments"""
+
+    # pylint: disable=line-too-long
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file. You can download these via script `get_transcript_data.py`")
+    parser.add_argument("-filter", dest="FILTER", default="", help="Filter query string; leave blank if no filter")
+    parser.add_argument("-model", dest="MODEL", default="en_core_web_lg", help="The spaCy model to parse transcripts with")
+    parser.add_argument("-cache", dest="CACHE_DIR", default="data/cache/docs/", help="Directory to store parsed docs")
+    parser.add_argument("-workers", dest="WORKERS", default=1, type=int, help="Number of processes to parse transcripts with")
+    parser.add_argument("-batch", dest="BATCH_SIZE", default=32, type=int, help="Number of transcripts to parse per batch")
+    args = parser.parse_args()
+    return args
+
+def main(a):
+    """Main function to parse transcripts and store them in the doc cache"""
+
+    # Only the rows that match the filter (if any) are read
+    fieldnames, rows = iterCsv(a.INPUT_FILE, queryString=a.FILTER)
+
+    nlp = spacy.load(a.MODEL)
+    transcripts = (row["Transcription"] for row in rows)
+    _cache, parsedCount = cacheDocs(nlp, transcripts, a.CACHE_DIR, a.BATCH_SIZE, a.WORKERS)
+    print(f"Parsed {parsedCount} transcripts that were not in the cache")
+
+main(parseArgs())
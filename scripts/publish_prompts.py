@@ -15,6 +15,7 @@ def parseArgs():
     parser.add_argument("-prompts", dest="PROMPT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_prompts.csv", help="A prompt .csv file generated via get_prompts.py")
     parser.add_argument("-starred", dest="STARRED_PROMPTS", default="data/mary-church-terrell-starred-prompts.txt", help="A list of prompts that should be starred")
     parser.add_argument("-stop", dest="STOP_TEXTS", default="nigge", help="A list of text that should be excluded")
+    parser.add_argument("-shard", dest="SHARD_SIZE", default=250, type=int, help="Number of docs per shard of the -docs file so the interface only loads the docs it shows; use 0 to write a single file")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="public/data/mary-church-terrell/prompts.json", help="Output JSON file")
     args = parser.parse_args()
     return args
@@ -28,7 +29,7 @@ def main(a):
     # Read data from .csv file
     dFields, docs = readCsv(a.INPUT_FILE)
     pFields, prompts = readCsv(a.PROMPT_FILE)
-    starred = readText(a.STARRED_PROMPTS, True)
+    starred = set(readText(a.STARRED_PROMPTS, True))
     stops = [t.strip().lower() for t in a.STOP_TEXTS.split(",")]
     stops = [t for t in stops if len(t) > 0]
 
@@ -57,11 +58,8 @@ def main(a):
         prompts = validPrompts
         print(f"{len(prompts)} prompts after filtering stop words")
 
-    # Remove duplicate prompts
-    promptGroups = groupList(prompts, "text")
-    prompts = []
-    for group in promptGroups:
-        prompts.append(group["items"][0])
+    # Remove duplicate prompts, keeping the first of each, sorted by text
+    prompts = sorted(iterUniqueBy(prompts, "text"), key=itemgetter("text"))
     print(f"{len(prompts)} prompts after removing duplicates")
 
     # Add metadata to prompts
@@ -86,8 +84,9 @@ def main(a):
         matchedDocs.append(doc)
 
     # Re-map doc indices
+    matchedDocsByIndex = indexBy(matchedDocs, "Index")
     for i, prompt in enumerate(prompts):
-        doc = findInList(matchedDocs, "Index", prompt["doc"])
+        doc = matchedDocsByIndex[prompt["doc"]]
         prompts[i]["doc"] = doc["newIndex"]
 
     # Get date range
@@ -118,14 +117,6 @@ def main(a):
     # Write docs
     docCols = ["ResourceID", "Item", "DownloadUrl", "Transcription", "ItemAssetIndex"]
     docGroups = ["ResourceID", "Item"]
-    docRows, docGroups = unzipList(matchedDocs, docCols, docGroups)
-    jsonOut = {
-        "docs": {
-            "cols": docCols,
-            "rows": flattenList(docRows),
-            "groups": docGroups
-        }
-    }
-    writeJSON(appendToFilename(a.OUTPUT_FILE, "-docs"), jsonOut)
+    writeShardedTable(appendToFilename(a.OUTPUT_FILE, "-docs"), matchedDocs, docCols, docGroups, a.SHARD_SIZE, isFlattened=True)
 
 main(parseArgs())
@@ -3,16 +3,77 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import dateparser
 import datetime
+import numpy as np
 import re
 
 from utilities import *
 
-def isSpecificDate(date):
-    if date is None:
-        return False
-    return date.month > 1 or date.day > 1
+# Circa dates in item titles, e.g. circa 1903 or circa 1880-1884
+CIRCA_YEAR_PATTERN = re.compile(r".*circa (1[0-9][0-9][0-9]) .*")
+CIRCA_RANGE_PATTERN = re.compile(r".*circa (1[0-9][0-9][0-9])\-(1[0-9][0-9][0-9]).*")
+
+# Dates are held in arrays of seconds so missing dates can be NaT
+DAY = np.timedelta64(1, "D")
+
+def getCircaDates(titles):
+    """Function to get arrays of the circa years (e.g. circa 1903) and circa year ranges (e.g. circa 1880-1884) in item titles; titles without one are NaT"""
+    # Titles repeat for every page of an item, so each is only matched once
+    uniqueTitles, inverse = np.unique(np.array(titles, dtype=object), return_inverse=True)
+    years = np.full(len(uniqueTitles), np.datetime64("NaT"), dtype="datetime64[s]")
+    rangeStarts = years.copy()
+    rangeEnds = years.copy()
+    for j, title in enumerate(uniqueTitles):
+        matches = CIRCA_YEAR_PATTERN.match(title)
+        if matches:
+            years[j] = np.datetime64(matches.group(1), "Y")
+            continue
+        matches = CIRCA_RANGE_PATTERN.match(title)
+        if matches:
+            rangeStarts[j] = np.datetime64(matches.group(1), "Y")
+            rangeEnds[j] = np.datetime64(matches.group(2), "Y")
+    return (years[inverse], rangeStarts[inverse], rangeEnds[inverse])
+
+def getDateRanges(dateStrings):
+    """Function to get arrays of the start and end dates of metadata date strings (see getDateRange); dates that can't be parsed are NaT"""
+    uniqueStrings, inverse = np.unique(np.array(dateStrings, dtype=object), return_inverse=True)
+    ranges = [getDateRange(dateString) for dateString in uniqueStrings]
+    starts = toDateArray([start for start, end in ranges])
+    ends = toDateArray([end for start, end in ranges])
+    return (starts[inverse], ends[inverse])
+
+def getDeltaDays(startDates, endDates):
+    """Function to get the whole days between arrays of dates; 0 where either is NaT"""
+    deltaDays = np.zeros(len(startDates), dtype=np.int64)
+    hasRange = ~np.isnat(startDates) & ~np.isnat(endDates)
+    deltaDays[hasRange] = (endDates[hasRange] - startDates[hasRange]) // DAY
+    return deltaDays
+
+def getFirstTranscriptDates(transcriptDates, startDates, endDates):
+    """Function to get an array of the first transcript date of each row that is within its metadata date range (or any date if the row has no range); NaT if there is none"""
+    # Flatten the dates of all rows so they can be compared to their row's range at once
+    counts = np.array([len(dates) for dates in transcriptDates], dtype=np.int64)
+    dateRows = np.repeat(np.arange(len(transcriptDates)), counts)
+    dates = toDateArray([date for dates in transcriptDates for date in dates])
+    starts = startDates[dateRows]
+    ends = endDates[dateRows]
+    noRange = np.isnat(starts) | np.isnat(ends)
+    isValid = ~np.isnat(dates) & (noRange | ((starts <= dates) & (dates <= ends)))
+    # Dates are in row order, so the first valid date of each row is the first index of that row
+    firstDates = np.full(len(transcriptDates), np.datetime64("NaT"), dtype="datetime64[s]")
+    validRows, firstIndices = np.unique(dateRows[isValid], return_index=True)
+    firstDates[validRows] = dates[isValid][firstIndices]
+    return firstDates
+
+def getTranscriptDates(row, hasIsoDates):
+    """Function to get the dates found in a row's transcript, from the ISO dates written by parse_dates.py if there are any, otherwise by parsing the matched text again"""
+    if hasIsoDates:
+        return [parsePartialDate(d)[0] for d in row["TranscriptDatesISO"].split(" | ")]
+    return [parseDate(d) for d in row["TranscriptDates"].split(" | ")]
+
+def isSpecificDate(dates):
+    """Function to check an array of dates for ones that are not the first of January, i.e. ones that give a month or day"""
+    return ~np.isnat(dates) & (dates.astype("datetime64[D]") != dates.astype("datetime64[Y]").astype("datetime64[D]"))
 
 # Arguments
 def parseArgs():
@@ -27,6 +88,10 @@ def parseArgs():
     args = parser.parse_args()
     return args
 
+def toDateArray(dates):
+    """Function to convert a list of datetimes (or None) to an array of seconds"""
+    return np.array([np.datetime64(date.replace(tzinfo=None), "s") if date is not None else np.datetime64("NaT") for date in dates], dtype="datetime64[s]")
+
 def main(a):
     """Main function to make the best estimation of date of document"""
 
@@ -35,137 +100,122 @@ def main(a):
         # Make sure output dirs exist
         makeDirectories(OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.INPUT_FILE)
+    # Only read the columns we need from columnar files, unless we need to filter on other columns
+    columns = None
+    if isColumnarFile(a.INPUT_FILE) and len(a.FILTER) <= 0:
+        columns = ["Dates", "TranscriptDates", "TranscriptDatesISO", "Item", "ResourceID"]
+
+    fieldnames, rows = readCsv(a.INPUT_FILE, columns=columns)
+    # Files from older versions of parse_dates.py only have the matched text, which has to be parsed again
+    hasIsoDates = "TranscriptDatesISO" in fieldnames
+    if not hasIsoDates:
+        print("No TranscriptDatesISO column; parsing TranscriptDates instead")
     rowCount = len(rows)
-    dateFormat = "%Y-%m-%d"
 
     # Filter data if necessary
     if len(a.FILTER) > 0:
         rows = filterByQueryString(rows, a.FILTER)
         rowCount = len(rows)
-    
-    prevResourceId = None
-    prevEstimatedDateStart = None
-    prevEstimatedDateEnd = None
-    datesFromMetadataUsed = 0
-    datesFromTranscriptsUsed = 0
-    estimatedDatesUsed = 0
-
-    # Retrieve resource data for each row
+
+    # Each rule below is applied to all rows at once; later rules only fill rows that are still undated
+    resourceIds = np.array([row["ResourceID"] for row in rows], dtype=object)
+    firstInSequence = np.ones(rowCount, dtype=bool)
+    firstInSequence[1:] = resourceIds[1:] != resourceIds[:-1]
+
+    startDates, endDates = getDateRanges([row["Dates"] for row in rows])
+    deltaDays = getDeltaDays(startDates, endDates)
+    dateIsDay = (0 < deltaDays) & (deltaDays < 2)
+    estimatedDateStart = np.full(rowCount, np.datetime64("NaT"), dtype="datetime64[s]")
+    estimatedDateEnd = estimatedDateStart.copy()
+    estimatedDateConfidence = np.zeros(rowCount, dtype=np.int64)
+
+    # Exact day is already set in data
+    estimatedDateStart[dateIsDay] = startDates[dateIsDay]
+    estimatedDateEnd[dateIsDay] = endDates[dateIsDay]
+    estimatedDateConfidence[dateIsDay] = 99
+    datesFromMetadataUsed = np.count_nonzero(dateIsDay)
+
+    # Check to see if it's in the title
+    circaYears, circaRangeStarts, circaRangeEnds = getCircaDates([row["Item"] for row in rows])
+    # check for circa specific year, e.g. circa 1903
+    isCircaYear = ~dateIsDay & ~np.isnat(circaYears)
+    estimatedDateStart[isCircaYear] = circaYears[isCircaYear]
+    estimatedDateEnd[isCircaYear] = (circaYears[isCircaYear].astype("datetime64[Y]") + 1).astype("datetime64[s]")
+    estimatedDateConfidence[isCircaYear] = 80
+    datesFromMetadataUsed += np.count_nonzero(isCircaYear)
+    dateIsDay |= isCircaYear
+    # check for circa specific range, e.g. circa 1880-1884; this replaces the metadata date range
+    isCircaRange = ~dateIsDay & ~np.isnat(circaRangeStarts)
+    startDates[isCircaRange] = circaRangeStarts[isCircaRange]
+    endDates[isCircaRange] = circaRangeEnds[isCircaRange]
+    deltaDays = getDeltaDays(startDates, endDates)
+    dateIsDay |= (0 < deltaDays) & (deltaDays < 2)
+    dateIsWithinYear = (1 < deltaDays) & (deltaDays < 365)
+    dateIsYear = (365 <= deltaDays) & (deltaDays <= 366)
+    dateIsYearRange = deltaDays > 366
+
+    # Check the transcripts of the rest
+    transcriptDate = getFirstTranscriptDates([getTranscriptDates(row, hasIsoDates) for row in rows], startDates, endDates)
+    hasRange = ~np.isnat(startDates) & ~np.isnat(endDates)
+    isUndated = ~dateIsDay
+    useTranscript = isUndated & hasRange & ~np.isnat(transcriptDate)
+    datesFromTranscriptsUsed = np.count_nonzero(useTranscript)
+
+    # parsed a specific date
+    isTranscriptDay = useTranscript & isSpecificDate(transcriptDate)
+    estimatedDateStart[isTranscriptDay] = transcriptDate[isTranscriptDay]
+    estimatedDateEnd[isTranscriptDay] = transcriptDate[isTranscriptDay] + DAY
+    estimatedDateConfidence[isTranscriptDay] = 75
+
+    # parsed a year and the date metadata is a specific year or within a year
+    isMetadataYear = useTranscript & ~isTranscriptDay & (dateIsWithinYear | dateIsYear)
+    estimatedDateStart[isMetadataYear] = startDates[isMetadataYear]
+    estimatedDateEnd[isMetadataYear] = endDates[isMetadataYear]
+    estimatedDateConfidence[isMetadataYear] = 90
+
+    # parsed a year
+    isTranscriptYear = useTranscript & ~isTranscriptDay & ~isMetadataYear
+    estimatedDateStart[isTranscriptYear] = transcriptDate[isTranscriptYear]
+    estimatedDateEnd[isTranscriptYear] = (transcriptDate[isTranscriptYear].astype("datetime64[Y]") + 1).astype("datetime64[s]")
+    estimatedDateConfidence[isTranscriptYear] = 50
+
+    # if date range is greater than a year and not first in sequence, inherit the previous date
+    isInherited = isUndated & ~useTranscript & (~hasRange | dateIsYearRange) & ~firstInSequence
+    estimatedDatesUsed = np.count_nonzero(isInherited)
+
+    # No date is available, defer to metadata date
+    isMetadataRange = isUndated & ~useTranscript & ~isInherited & (~np.isnat(startDates) | ~np.isnat(endDates))
+    estimatedDateStart[isMetadataRange] = startDates[isMetadataRange]
+    estimatedDateEnd[isMetadataRange] = endDates[isMetadataRange]
+    estimatedDateConfidence[isMetadataRange] = 90
+
+    # Inherited dates are filled in last, once the dates they inherit are set. The first row of each sequence never inherits, so carrying forward the last index that didn't inherit stays within the sequence
+    sourceRows = np.maximum.accumulate(np.where(isInherited, 0, np.arange(rowCount)))
+    estimatedDateStart[isInherited] = estimatedDateStart[sourceRows][isInherited]
+    estimatedDateEnd[isInherited] = estimatedDateEnd[sourceRows][isInherited]
+    estimatedDateConfidence[isInherited] = 25
+
+    # If range under 10 years, take the middle
+    estimatedYears = estimatedDateStart.astype("datetime64[Y]").astype(np.int64) + 1970
+    estimatedEndYears = estimatedDateEnd.astype("datetime64[Y]").astype(np.int64) + 1970
+    estimatedYear = estimatedYears + ((estimatedEndYears - estimatedYears) / 2).astype(np.int64)
+    hasEstimatedYear = (getDeltaDays(estimatedDateStart, estimatedDateEnd) < 365 * 10) & ~np.isnat(estimatedDateStart) & ~np.isnat(estimatedDateEnd)
+
+    startStrings = np.datetime_as_string(estimatedDateStart, unit="D").tolist()
+    endStrings = np.datetime_as_string(estimatedDateEnd, unit="D").tolist()
+    confidences = estimatedDateConfidence.tolist()
+    years = estimatedYear.tolist()
+    hasYears = hasEstimatedYear.tolist()
     for i, row in enumerate(rows):
-        transcriptDates = []
-        dates = row["Dates"]
-
-        resourceID = row["ResourceID"]
-        firstInSequence = resourceID != prevResourceId
-        prevResourceId = resourceID
-
-        startDate, endDate = getDateRange(dates)
-        deltaDays = 0
-        if startDate is not None and endDate is not None:
-            deltaDays = (endDate - startDate).days
-        dateIsDay = 0 < deltaDays < 2
-        dateIsWithinYear = 1 < deltaDays < 365
-        dateIsYear = 365 <= deltaDays <= 366
-        dateIsYearRange = deltaDays > 366
-        estimatedDateStart = None
-        estimatedDateEnd = None
-        estimatedDateConfidence = 0
-
-        # Exact year is already set in data
-        if dateIsDay:
-            estimatedDateStart = startDate
-            estimatedDateEnd = endDate
-            estimatedDateConfidence = 99
-            datesFromMetadataUsed += 1
-
-        # Check to see if it's in the title
-        if estimatedDateStart is None or estimatedDateEnd is None:
-            title = row["Item"]
-            # check for circa specific year, e.g. circa 1903
-            pattern = re.compile(r".*circa (1[0-9][0-9][0-9]) .*")
-            matches = pattern.match(title)
-            if matches:
-                estimatedDateStart = datetime.datetime(int(matches.group(1)), 1, 1)
-                estimatedDateEnd = datetime.datetime(int(matches.group(1))+1, 1, 1)
-                estimatedDateConfidence = 80
-                dateIsDay = True
-                datesFromMetadataUsed += 1
-
-            # check for circa specific range, e.g. circa 1880-1884
-            else:
-                pattern = re.compile(r".*circa (1[0-9][0-9][0-9])\-(1[0-9][0-9][0-9]).*")
-                matches = pattern.match(title)
-                if matches:
-                    startDate = datetime.datetime(int(matches.group(1)), 1, 1)
-                    endDate = datetime.datetime(int(matches.group(2)), 1, 1)
-                    deltaDays = (endDate - startDate).days
-                    dateIsDay = 0 < deltaDays < 2
-                    dateIsWithinYear = 1 < deltaDays < 365
-                    dateIsYear = 365 <= deltaDays <= 366
-                    dateIsYearRange = deltaDays > 366
-            
-        if not dateIsDay:
-            transcriptDate = None
-            transcriptDates = [dateparser.parse(d, settings={'REQUIRE_PARTS': ['year'], 'PREFER_DAY_OF_MONTH': 'first'}) for d in row["TranscriptDates"].split(" | ")]
-            if len(transcriptDates) > 0:
-                # choose the first date that is within the metadata date range
-                for date in transcriptDates:
-                    if date is None:
-                        continue
-                    date = date.replace(tzinfo=None)
-                    if startDate is None or endDate is None or startDate <= date <= endDate:
-                        transcriptDate = date
-                        break
-            
-            if startDate is not None and endDate is not None and transcriptDate is not None:
-                # parsed a specific date
-                if isSpecificDate(transcriptDate):
-                    estimatedDateStart = transcriptDate
-                    estimatedDateEnd = transcriptDate + datetime.timedelta(days=1)
-                    estimatedDateConfidence = 75
-
-                # parsed a year and the date metadata is a specific year or within a year
-                elif dateIsWithinYear or dateIsYear:
-                    estimatedDateStart = startDate
-                    estimatedDateEnd = endDate
-                    estimatedDateConfidence = 90
-
-                # parsed a year
-                else:
-                    estimatedDateStart = transcriptDate
-                    estimatedDateEnd = datetime.datetime(transcriptDate.year + 1, transcriptDate.month, transcriptDate.day)
-                    estimatedDateConfidence = 50
-
-                datesFromTranscriptsUsed += 1
-
-            # if date range is greater than a year and not first in sequence, inheret the previous date
-            elif (startDate is None or endDate is None or dateIsYearRange) and not firstInSequence:
-                estimatedDateStart = prevEstimatedDateStart
-                estimatedDateEnd = prevEstimatedDateEnd
-                estimatedDateConfidence = 25
-                estimatedDatesUsed += 1
-
-            # No date is available, defer to metadata date
-            elif startDate is not None or endDate is not None:
-                estimatedDateStart = startDate
-                estimatedDateEnd = endDate
-                estimatedDateConfidence = 90
-
-        prevEstimatedDateStart = estimatedDateStart
-        prevEstimatedDateEnd = estimatedDateEnd
-
-        rows[i]["EstimatedDateStart"] = estimatedDateStart.strftime(dateFormat) if estimatedDateStart is not None else ""
-        rows[i]["EstimatedDateEnd"] = estimatedDateEnd.strftime(dateFormat) if estimatedDateEnd is not None else ""
-        rows[i]["EstimatedDateConfidence"] = estimatedDateConfidence
-
-        deltaDays = (estimatedDateEnd - estimatedDateStart).days
-        # If range under 10 years, take the middle
-        if deltaDays < (365 * 10):
-            deltaYears = 0.5 * (estimatedDateEnd.year - estimatedDateStart.year)
-            rows[i]["EstimatedYear"] = estimatedDateStart.year + int(deltaYears)
-        
-        printProgress(i+1, rowCount, "Progress: ")
+        row["EstimatedDateStart"] = startStrings[i] if startStrings[i] != "NaT" else ""
+        row["EstimatedDateEnd"] = endStrings[i] if endStrings[i] != "NaT" else ""
+        row["EstimatedDateConfidence"] = confidences[i]
+        if hasYears[i]:
+            row["EstimatedYear"] = years[i]
+
+    dateCache = getDateCache()
+    print(f"Date cache: {dateCache.hits} hits, {dateCache.misses} misses")
+    print(f"Metadata dates: {dateParseCounts['fast']} read directly, {dateParseCounts['fallback']} parsed with dateparser")
 
     if a.PROBE:
         print(f"{datesFromMetadataUsed} dates from metadata used ({1.0*datesFromMetadataUsed/rowCount*100}% of total)")
@@ -176,6 +226,10 @@ def main(a):
 
     # Add fields to new data
     fieldsToAdd = ["EstimatedDateStart", "EstimatedDateEnd", "EstimatedDateConfidence", "EstimatedYear"]
+    if columns is not None:
+        writeColumns(OUTPUT_FILE, rows, fieldsToAdd, a.INPUT_FILE)
+        return
+
     for field in fieldsToAdd:
         if field not in fieldnames:
             fieldnames.append(field)
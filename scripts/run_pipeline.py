@@ -0,0 +1,264 @@
+"""Script for running a pipeline of scripts, only re-running stages whose inputs or parameters have changed"""
+
+# -*- coding: utf-8 -*-
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import subprocess
+import threading
+import time
+
+from utilities import *
+
+# Arguments
+def parseArgs():
+    """Function to parse script arguments"""
+
+    # pylint: disable=line-too-long
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-config", dest="CONFIG_FILE", default="pipelines/mary-church-terrell.json", help="A pipeline .json file that declares each stage's script, arguments, inputs, and outputs")
+    parser.add_argument("-state", dest="STATE_DIR", default="data/cache/pipeline/", help="Directory to store the pipeline state and stage logs")
+    parser.add_argument("-workers", dest="WORKERS", default=2, type=int, help="Maximum number of stages to run at the same time")
+    parser.add_argument("-force", dest="FORCE", default="", help="Comma-separated list of stage names to run even if they are current; use 'all' to run every stage")
+    parser.add_argument("-probe", dest="PROBE", action="store_true", help="Just output which stages would run; do not run anything")
+    args = parser.parse_args()
+    return args
+
+def getArgList(args, variables):
+    """Convert a dict of script arguments to a list of command line arguments"""
+    argList = []
+    for key, value in args.items():
+        if value is True:
+            argList.append(key)
+        elif value is not False and value is not None:
+            argList += [key, replaceVariables(str(value), variables)]
+    return argList
+
+def getDependencies(stages):
+    """Derive stage dependencies from the order in which stages read and write files"""
+    lastWriter = {}
+    readersSinceWrite = {}
+    for i, stage in enumerate(stages):
+        deps = set()
+        for filename in stage["inputs"]:
+            # read after write
+            if filename in lastWriter:
+                deps.add(lastWriter[filename])
+        for filename in stage["outputs"]:
+            # write after write
+            if filename in lastWriter:
+                deps.add(lastWriter[filename])
+            # write after read
+            deps.update(readersSinceWrite.get(filename, []))
+        deps.discard(i)
+        stage["deps"] = sorted(deps)
+        for filename in stage["inputs"]:
+            readersSinceWrite.setdefault(filename, []).append(i)
+        for filename in stage["outputs"]:
+            lastWriter[filename] = i
+            readersSinceWrite[filename] = []
+    return stages
+
+def hashPath(path, fileHashes):
+    """Hash the contents of a file or directory, re-using hashes of files whose size and modification time have not changed"""
+    if os.path.isdir(path):
+        h = hashlib.sha1()
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                filepath = os.path.join(dirpath, filename)
+                h.update(os.path.relpath(filepath, path).encode("utf8"))
+                h.update(hashPath(filepath, fileHashes).encode("utf8"))
+        return h.hexdigest()
+
+    if not os.path.isfile(path):
+        return "missing"
+
+    stat = os.stat(path)
+    signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+    if path in fileHashes and fileHashes[path]["signature"] == signature:
+        return fileHashes[path]["hash"]
+
+    fileHashes[path] = {"signature": signature, "hash": getFileHash(path)}
+    return fileHashes[path]["hash"]
+
+def loadPipeline(filename):
+    """Read a pipeline config file and resolve its variables"""
+    config = readJSON(filename)
+    variables = config.get("variables", {})
+    stages = []
+    for stage in config["stages"]:
+        stages.append({
+            "name": stage["name"],
+            "script": stage["script"],
+            "args": getArgList(stage.get("args", {}), variables),
+            "inputs": [replaceVariables(fn, variables) for fn in stage.get("inputs", [])],
+            "outputs": [replaceVariables(fn, variables) for fn in stage.get("outputs", [])]
+        })
+    return getDependencies(stages)
+
+def replaceVariables(string, variables):
+    """Replace {variable} placeholders in a string"""
+    for key, value in variables.items():
+        string = string.replace(f"{{{key}}}", value)
+    return string
+
+def getStageKey(stage, inputVersions, fileHashes):
+    """Build a key for a stage from its script, arguments, and the versions of its inputs"""
+    data = {
+        "script": hashPath(stage["script"], fileHashes),
+        "args": stage["args"],
+        "inputs": inputVersions
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf8")).hexdigest()
+
+def main(a):
+    """Main function to run a pipeline of scripts"""
+
+    stages = loadPipeline(a.CONFIG_FILE)
+    stageCount = len(stages)
+    stateFile = os.path.join(a.STATE_DIR, f"{getBasename(a.CONFIG_FILE)}.json")
+    logDir = os.path.join(a.STATE_DIR, "logs", getBasename(a.CONFIG_FILE), "")
+    makeDirectories([stateFile, logDir])
+    state = readJSON(stateFile)
+    state.setdefault("stages", {})
+    state.setdefault("files", {})
+    stageStates = state["stages"]
+    fileHashes = state["files"]
+    force = [name.strip() for name in a.FORCE.split(",") if len(name.strip()) > 0]
+
+    # The stage that last wrote each file before a given stage
+    producers = []
+    lastWriter = {}
+    for i, stage in enumerate(stages):
+        producers.append({filename: lastWriter[filename] for filename in stage["inputs"] if filename in lastWriter})
+        for filename in stage["outputs"]:
+            lastWriter[filename] = i
+
+    def getInputVersions(i, outputVersions):
+        """Inputs written by an earlier stage are identified by that stage's output hash; all others by their content hash"""
+        versions = {}
+        for filename in stages[i]["inputs"]:
+            producer = producers[i].get(filename)
+            if producer is not None:
+                versions[filename] = outputVersions[producer].get(filename) if outputVersions[producer] is not None else None
+            else:
+                versions[filename] = hashPath(filename, fileHashes)
+        return versions
+
+    def isCurrent(i, key):
+        """Check if a stage's recorded run matches its key and its outputs are still in place"""
+        stage = stages[i]
+        stageState = stageStates.get(stage["name"])
+        if stageState is None or stageState["key"] != key:
+            return False
+        for filename in stage["outputs"]:
+            if not os.path.exists(filename):
+                return False
+            # Only the last stage to write a file can check the file's current contents
+            if lastWriter[filename] == i and hashPath(filename, fileHashes) != stageState["outputs"].get(filename):
+                return False
+        return True
+
+    # Work out which stages are stale given what was recorded on the last run
+    recordedOutputs = [stageStates[s["name"]]["outputs"] if s["name"] in stageStates else None for s in stages]
+    stale = []
+    for i, stage in enumerate(stages):
+        key = getStageKey(stage, getInputVersions(i, recordedOutputs), fileHashes)
+        stale.append("all" in force or stage["name"] in force or not isCurrent(i, key))
+
+    # A stale stage that reads a file that was updated in place by later stages needs the earlier stages to run again
+    for i in reversed(range(stageCount)):
+        if not stale[i]:
+            continue
+        for filename, producer in producers[i].items():
+            if recordedOutputs[producer] is None or hashPath(filename, fileHashes) != recordedOutputs[producer].get(filename):
+                stale[producer] = True
+
+    if a.PROBE:
+        for i, stage in enumerate(stages):
+            deps = ", ".join([stages[dep]["name"] for dep in stage["deps"]])
+            status = "run" if stale[i] else "current (unless an upstream stage changes its output)"
+            print(f"{stage['name']} [after: {deps}]: {status}")
+        return
+
+    outputVersions = list(recordedOutputs)
+    rewritten = set()
+    lock = threading.Lock()
+
+    def runStage(i):
+        """Run a single stage as a subprocess, logging its output to file"""
+        stage = stages[i]
+        logFile = f"{logDir}{stage['name']}.log"
+        command = [sys.executable, stage["script"]] + stage["args"]
+        startTime = time.time()
+        with open(logFile, "w", encoding="utf8") as f:
+            result = subprocess.run(command, stdout=f, stderr=subprocess.STDOUT, check=False)
+        return (result.returncode, time.time() - startTime, logFile)
+
+    def prepareStage(i):
+        """Decide whether a stage whose dependencies are done needs to run; returns its key"""
+        stage = stages[i]
+        with lock:
+            key = getStageKey(stage, getInputVersions(i, outputVersions), fileHashes)
+            needsRun = stale[i] or not isCurrent(i, key) or len(rewritten.intersection(stage["outputs"])) > 0
+        return (key, needsRun)
+
+    def completeStage(i, key):
+        """Record the outputs of a stage that just ran"""
+        stage = stages[i]
+        with lock:
+            outputs = {}
+            for filename in stage["outputs"]:
+                outputs[filename] = hashPath(filename, fileHashes)
+                rewritten.add(filename)
+            stageStates[stage["name"]] = {
+                "key": key,
+                "outputs": outputs,
+                "completed": datetime.datetime.now().isoformat()
+            }
+            outputVersions[i] = outputs
+            writeJSON(stateFile, state, verbose=False, pretty=True)
+
+    done = set()
+    failed = []
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, a.WORKERS)) as executor:
+        while len(done) < stageCount:
+            # Queue up every stage whose dependencies are done
+            if len(failed) <= 0:
+                for i, stage in enumerate(stages):
+                    if i in done or i in [index for index, _ in running.values()] or not all(dep in done for dep in stage["deps"]):
+                        continue
+                    key, needsRun = prepareStage(i)
+                    if not needsRun:
+                        print(f"Skipping {stage['name']}; already current")
+                        done.add(i)
+                        continue
+                    print(f"Running {stage['name']}...")
+                    running[executor.submit(runStage, i)] = (i, key)
+            if len(running) <= 0:
+                break
+
+            finished, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                i, key = running.pop(future)
+                stage = stages[i]
+                returncode, seconds, logFile = future.result()
+                if returncode != 0:
+                    print(f"Failed {stage['name']} after {round(seconds, 1)}s; see {logFile}")
+                    print("\n".join(readText(logFile, True)[-10:]))
+                    failed.append(stage["name"])
+                else:
+                    completeStage(i, key)
+                    print(f"Completed {stage['name']} in {round(seconds, 1)}s")
+                done.add(i)
+
+    writeJSON(stateFile, state, verbose=False, pretty=True)
+    if len(failed) > 0:
+        print(f"Pipeline stopped: {', '.join(failed)} failed")
+        sys.exit(1)
+    print("Pipeline complete.")
+
+main(parseArgs())
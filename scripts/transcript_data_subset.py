@@ -30,15 +30,12 @@ def main(a):
         # Make sure output dirs exist
         makeDirectories(a.OUTPUT_FILE)
 
-    fieldnames, rows = readCsv(a.TRANSCRIPT)
+    # Only the rows that match the filter (if any) are read
+    fieldnames, rows = iterCsv(a.TRANSCRIPT, queryString=a.FILTER)
 
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        rows = filterByQueryString(rows, a.FILTER)
-
-     # Sort data if necessary
+     # Sort data if necessary; this requires reading all the rows into memory
     if len(a.SORT) > 0:
-        rows = sortByQueryString(rows, a.SORT)
+        rows = sortByQueryString(list(rows), a.SORT)
 
     includeFields = None
     if len(a.INCLUDE_FIELDS) > 0:
@@ -58,7 +55,8 @@ def main(a):
         print(f'Only including fields {fieldnames}')
         return
 
-    # Write data to file
-    writeCsv(a.OUTPUT_FILE, rows, fieldnames)
+    # Write data to file one row at a time
+    with CsvWriter(a.OUTPUT_FILE, fieldnames) as writer:
+        writer.writerows(rows)
 
 main(parseArgs())
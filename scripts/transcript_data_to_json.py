@@ -16,6 +16,7 @@ def parseArgs():
     parser.add_argument("-filter", dest="FILTER", default="", help="Filter query string; leave blank if no filter")
     parser.add_argument("-fields", dest="FIELDS", default="ResourceID,Item,DownloadUrl,Transcription,ItemAssetIndex,Project,EstimatedYear", help="Comma-separated list of fields to output")
     parser.add_argument("-group", dest="GROUP_FIELDS", default="ResourceID,Item,Project", help="Comma-separated list of fields that we should try to group together in the output b/c they have non-unique values")
+    parser.add_argument("-shard", dest="SHARD_SIZE", default=250, type=int, help="Number of transcripts per shard so the interface only loads what it shows; the output file becomes a manifest of the shards. Use 0 to write a single file")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="public/data/mary-church-terrell/transcripts.json", help="Output JSON file")
     args = parser.parse_args()
     return args
@@ -26,12 +27,8 @@ def main(a):
     # Make sure output dirs exist
     makeDirectories(a.OUTPUT_FILE)
 
-    # Read data from .csv file
-    fieldnames, pages = readCsv(a.TRANSCRIPT_INPUT_FILE)
-
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        pages = filterByQueryString(pages, a.FILTER)
+    # Read data from .csv file; only the rows that match the filter (if any) are read
+    fieldnames, pages = readCsv(a.TRANSCRIPT_INPUT_FILE, queryString=a.FILTER)
 
     # Parse columns and groups
     cols = [field.strip() for field in a.FIELDS.split(",")]
@@ -52,14 +49,7 @@ def main(a):
         if "ItemAssetIndex" in cols:
             pages[i]["ItemAssetIndex"] = int(row["ItemAssetIndex"])
 
-    rows, groups = unzipList(pages, cols, colGroups)
-
     # Write JSON to file
-    jsonOut = {
-        "cols": cols,
-        "rows": rows,
-        "groups": groups
-    }
-    writeJSON(a.OUTPUT_FILE, jsonOut)
+    writeShardedTable(a.OUTPUT_FILE, pages, cols, colGroups, a.SHARD_SIZE)
 
 main(parseArgs())
@@ -3,6 +3,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+from contextlib import nullcontext
 from pprint import pprint
 import re
 
@@ -31,48 +32,46 @@ def main(a):
     newFields = [field.strip() for field in a.PATTERN_FIELDS.split(",")]
     pattern = re.compile(a.PATTERN)
 
-    # Read data from .csv file
-    fieldnames, pages = readCsv(a.TRANSCRIPT_INPUT_FILE)
+    # Read data from .csv file; only the rows that match the filter (if any) are read
+    fieldnames, pages = iterCsv(a.TRANSCRIPT_INPUT_FILE, queryString=a.FILTER)
 
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        pages = filterByQueryString(pages, a.FILTER)
+    for field in newFields:
+        if field not in fieldnames:
+            fieldnames.append(field)
+
+    if not a.PROBE:
+        # Make sure output dirs exist
+        makeDirectories(outputFile)
+
+    # The output is left untouched if anything fails before the end
+    with CsvWriter(outputFile, fieldnames) if not a.PROBE else nullcontext() as writer:
+        # Go through each page and find matches, writing each page to file as we go
+        matches = set()
+        noMatches = set()
+        for page in pages:
+            pageMatches = pattern.match(str(page[a.COLUMN_KEY]))
 
-    # Go through each page and find matches
-    matches = []
-    noMatches = []
-    for i, page in enumerate(pages):
-        pageMatches = pattern.match(str(page[a.COLUMN_KEY]))
+            if pageMatches:
+                match = []
+                for j, field in enumerate(newFields):
+                    value = pageMatches.group(j+1)
+                    page[field] = value
+                    match.append(value)
+                matches.add(", ".join(match))
 
-        if pageMatches:
-            match = []
-            for j, field in enumerate(newFields):
-                value = pageMatches.group(j+1)
-                pages[i][field] = value
-                match.append(value)
-            matches.append(", ".join(match))
+            else:
+                noMatches.add(page[a.COLUMN_KEY])
 
-        else:
-            noMatches.append(page[a.COLUMN_KEY])
+            if writer is not None:
+                writer.writerow(page)
 
     if len(noMatches) > 0:
-        noMatches = unique(noMatches)
         print("No matches found for:")
-        pprint(noMatches)
+        pprint(list(noMatches))
 
     if a.PROBE:
-        pprint(unique(matches))
+        pprint(list(matches))
         return
-    
-    for field in newFields:
-        if field not in fieldnames:
-            fieldnames.append(field)
-
-    # Make sure output dirs exist
-    makeDirectories(outputFile)
-
-    # Write data to file
-    writeCsv(outputFile, pages, fieldnames)
 
     print("Done.")
 
@@ -0,0 +1,88 @@
+"""Script exporting a prebuilt keyword search index of transcript data"""
+
+# -*- coding: utf-8 -*-
+
+import argparse
+import base64
+from collections import Counter
+
+from utilities import *
+
+# Words are runs of letters and numbers; the search interface splits queries with the equivalent pattern /[\p{L}\p{N}]+/gu
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Arguments
+def parseArgs():
+    """Function to parse script arguments"""
+
+    # pylint: disable=line-too-long
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-in", dest="TRANSCRIPT_INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file; use the same file and -filter as transcript_data_to_json.py so document ids line up with transcripts.json")
+    parser.add_argument("-filter", dest="FILTER", default="", help="Filter query string; leave blank if no filter")
+    parser.add_argument("-prefix", dest="PREFIX_LENGTH", default=2, type=int, help="Terms are sharded by their first this many characters, so a search only loads the shards for its terms")
+    parser.add_argument("-out", dest="OUTPUT_FILE", default="public/data/mary-church-terrell/search-index.json", help="Output JSON manifest; shards are written next to it")
+    args = parser.parse_args()
+    return args
+
+def encodePostings(postings):
+    """Encode a list of (doc id, term count) tuples sorted by doc id as base64 of varint pairs of (gap from previous doc id, term count)"""
+    values = []
+    prevDocId = 0
+    for docId, count in postings:
+        values += [docId - prevDocId, count]
+        prevDocId = docId
+    return base64.b64encode(encodeVarints(values)).decode("ascii")
+
+def tokenize(text):
+    """Function to split text into lowercase terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def main(a):
+    """Main function to output a search index of transcript data"""
+
+    # Make sure output dirs exist
+    makeDirectories(a.OUTPUT_FILE)
+
+    # Read data from .csv file; only the rows that match the filter (if any) are read
+    fieldnames, pages = readCsv(a.TRANSCRIPT_INPUT_FILE, columns=["Transcription"], queryString=a.FILTER)
+
+    # Build postings lists; docs are visited in order so each list is already sorted by doc id
+    postings = {}
+    pageCount = len(pages)
+    for docId, page in enumerate(pages):
+        for term, count in Counter(tokenize(page["Transcription"])).items():
+            postings.setdefault(term, []).append((docId, count))
+        printProgress(docId+1, pageCount, "Indexing transcripts... ")
+    print(f"\n{len(postings)} unique terms")
+
+    # Group terms into shards by prefix
+    shardTerms = {}
+    for term in postings:
+        shardTerms.setdefault(term[:a.PREFIX_LENGTH], []).append(term)
+
+    # Remove shards from previous runs
+    basename, fileExt = os.path.splitext(a.OUTPUT_FILE)
+    removeFiles(f"{basename}-*{fileExt}")
+
+    # Write shards; file names use the hex of the prefix so they are safe for any characters
+    shards = {}
+    for key in sorted(shardTerms):
+        terms = sorted(shardTerms[key])
+        shardFilename = appendToFilename(a.OUTPUT_FILE, f"-{key.encode('utf8').hex()}")
+        shard = {
+            "terms": terms,
+            "docCounts": [len(postings[term]) for term in terms],
+            "postings": [encodePostings(postings[term]) for term in terms]
+        }
+        writeJSON(shardFilename, shard, verbose=False)
+        shards[key] = os.path.basename(shardFilename)
+
+    manifest = {
+        "docCount": pageCount,
+        "prefixLength": a.PREFIX_LENGTH,
+        "shards": shards
+    }
+    writeJSON(a.OUTPUT_FILE, manifest, verbose=False)
+    print(f"Wrote manifest and {len(shards)} shards to {a.OUTPUT_FILE}")
+
+main(parseArgs())
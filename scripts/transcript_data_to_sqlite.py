@@ -0,0 +1,86 @@
+"""Script exporting transcript data to a SQLite full-text search database for the server's /api/search endpoint"""
+
+# -*- coding: utf-8 -*-
+
+import argparse
+import sqlite3
+
+from utilities import *
+
+# Arguments
+def parseArgs():
+    """Function to parse script arguments"""
+
+    # pylint: disable=line-too-long
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-in", dest="TRANSCRIPT_INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file that has been run through: add_resource_data_to_transcript_data.py and parse_dates.py and resolve_dates.py")
+    parser.add_argument("-filter", dest="FILTER", default="", help="Filter query string; leave blank if no filter")
+    parser.add_argument("-fields", dest="FIELDS", default="ResourceID,Item,DownloadUrl,ItemAssetIndex,Project,EstimatedYear", help="Comma-separated list of fields to store alongside each transcript")
+    parser.add_argument("-batch", dest="BATCH_SIZE", default=5000, type=int, help="Number of rows to insert at a time")
+    parser.add_argument("-out", dest="OUTPUT_FILE", default="data/search/mary-church-terrell.db", help="Output SQLite file; server.js looks for data/search/{project}.db")
+    args = parser.parse_args()
+    return args
+
+def main(a):
+    """Main function to output transcript data to a SQLite full-text search database"""
+
+    # Make sure output dirs exist
+    makeDirectories(a.OUTPUT_FILE)
+
+    # Stream rows from the input file so large collections are never held in memory
+    fields = [field.strip() for field in a.FIELDS.split(",")]
+    # Only the rows that match the filter (if any) are read
+    fieldnames, pages = iterCsv(a.TRANSCRIPT_INPUT_FILE, columns=fields + ["Transcription"], queryString=a.FILTER)
+    if "Transcription" not in fieldnames:
+        print(f"No Transcription column in {a.TRANSCRIPT_INPUT_FILE}")
+        sys.exit()
+    fields = [field for field in fields if field in fieldnames and field != "Transcription"]
+
+    # Build into a temporary file and swap it in at the end, so a running server never sees a partial database
+    tempFilename = a.OUTPUT_FILE + ".tmp"
+    if os.path.isfile(tempFilename):
+        os.remove(tempFilename)
+    conn = sqlite3.connect(tempFilename)
+    columns = fields + ["Transcription"]
+    columnDefs = ", ".join([f"{field} INTEGER" if field in ("EstimatedYear", "ItemAssetIndex") else f"{field} TEXT" for field in columns])
+    conn.execute(f"CREATE TABLE docs (id INTEGER PRIMARY KEY, {columnDefs})")
+
+    # Doc ids are row positions, the same as the indices in transcripts.json when exported with the same input and filter
+    insertSql = f"INSERT INTO docs (id, {', '.join(columns)}) VALUES ({', '.join(['?'] * (len(columns) + 1))})"
+    batch = []
+    count = 0
+    for docId, page in enumerate(pages):
+        values = [docId]
+        for field in fields:
+            value = page[field]
+            if field in ("EstimatedYear", "ItemAssetIndex"):
+                value = int(value) if value != "" else None
+            values.append(value)
+        values.append(page["Transcription"])
+        batch.append(values)
+        count += 1
+        if len(batch) >= a.BATCH_SIZE:
+            conn.executemany(insertSql, batch)
+            batch = []
+            printProgress(count, None, "Inserted rows: ")
+    if len(batch) > 0:
+        conn.executemany(insertSql, batch)
+    print(f"\nInserted {count} rows")
+
+    # Index the filter columns
+    for field in ("Project", "EstimatedYear"):
+        if field in fields:
+            conn.execute(f"CREATE INDEX idx_docs_{field} ON docs ({field})")
+
+    # The full-text index reads its text from the docs table (external content), so transcripts are only stored once
+    print("Building full-text index...")
+    conn.execute("CREATE VIRTUAL TABLE transcripts USING fts5(Transcription, content='docs', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    conn.execute("INSERT INTO transcripts (rowid, Transcription) SELECT id, Transcription FROM docs")
+    conn.execute("INSERT INTO transcripts (transcripts) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+
+    os.replace(tempFilename, a.OUTPUT_FILE)
+    print(f"Wrote {a.OUTPUT_FILE}")
+
+main(parseArgs())
@@ -29,26 +29,20 @@ def main(a):
     # Make sure output dirs exist
     makeDirectories(outputFile)
 
-    # Read data from .csv file
-    fieldnames, pages = readCsv(a.TRANSCRIPT_INPUT_FILE)
+    # Read data from .csv file; only the rows that match the filter (if any) are read
+    fieldnames, pages = iterCsv(a.TRANSCRIPT_INPUT_FILE, queryString=a.FILTER)
 
-    # Filter data if necessary
-    if len(a.FILTER) > 0:
-        pages = filterByQueryString(pages, a.FILTER)
-
-     # Sort data if necessary
+     # Sort data if necessary; this requires reading all the pages into memory
     if len(a.SORT) > 0:
-        pages = sortByQueryString(pages, a.SORT)
-
-    # Retrieve data from each page and build output string
-    output = ""
-    for page in pages:
-        output += f"Item: {page['Item']} ({page['ItemAssetIndex']} of {page['ItemAssetCount']})\n"
-        output += f"URL: {page['ResourceURL']}\n\n"
-        output += f"{page['Transcription']}\n"
-        output += "==========================================\n"
+        pages = sortByQueryString(list(pages), a.SORT)
 
+    # Retrieve data from each page and write it to file as we go
     print('Writing to file...')
-    writeText(outputFile, output)
+    with open(outputFile, "w", encoding="utf8", errors="replace") as f:
+        for page in pages:
+            f.write(f"Item: {page['Item']} ({page['ItemAssetIndex']} of {page['ItemAssetCount']})\n")
+            f.write(f"URL: {page['ResourceURL']}\n\n")
+            f.write(f"{page['Transcription']}\n")
+            f.write("==========================================\n")
 
 main(parseArgs())
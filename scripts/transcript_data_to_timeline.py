@@ -3,7 +3,7 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import collections
+import datetime
 from pprint import pprint
 
 from utilities import *
@@ -16,10 +16,41 @@ def parseArgs():
     parser = argparse.ArgumentParser()
     parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file that has been run through: add_resource_data_to_transcript_data.py and parse_dates.py and resolve_dates.py")
     parser.add_argument("-notes", dest="ANNOTATION_FILE", default="data/mary-church-terrell-biographical-notes.csv", help="A .csv with annotations to the timeline")
+    parser.add_argument("-granularity", dest="GRANULARITY", default="year", choices=["year", "month", "day"], help="Size of each timeline period; month and day timelines only include docs whose estimated date range falls within a single period")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="public/data/mary-church-terrell/timeline.json", help="Output JSON file")
     args = parser.parse_args()
     return args
 
+def getPeriod(doc, granularity):
+    """Return the year, (year, month), or date that a doc falls within, or None if its date is unknown or spans more than one period"""
+    if granularity == "year":
+        return doc["EstimatedYear"]
+    if doc["EstimatedDateStart"] == "" or doc["EstimatedDateEnd"] == "":
+        return None
+    dateStart = datetime.datetime.strptime(doc["EstimatedDateStart"], "%Y-%m-%d").date()
+    # end dates are exclusive
+    dateEnd = datetime.datetime.strptime(doc["EstimatedDateEnd"], "%Y-%m-%d").date() - datetime.timedelta(days=1)
+    if granularity == "month":
+        period = (dateStart.year, dateStart.month)
+        return period if (dateEnd.year, dateEnd.month) == period else None
+    return dateStart if dateEnd <= dateStart else None
+
+def getPeriodLabel(period, granularity):
+    """Return a period as it is written to the timeline"""
+    if granularity == "year":
+        return period
+    if granularity == "month":
+        return f"{period[0]}-{str(period[1]).zfill(2)}"
+    return period.isoformat()
+
+def getPeriods(startPeriod, endPeriod, granularity):
+    """Return every period from start to end, inclusive"""
+    if granularity == "year":
+        return list(range(startPeriod, endPeriod + 1))
+    if granularity == "month":
+        return [(monthIndex // 12, monthIndex % 12 + 1) for monthIndex in range(startPeriod[0] * 12 + startPeriod[1] - 1, endPeriod[0] * 12 + endPeriod[1])]
+    return [startPeriod + datetime.timedelta(days=days) for days in range((endPeriod - startPeriod).days + 1)]
+
 def main(a):
     """Main function to output transcript data to timeline interface"""
 
@@ -34,44 +65,53 @@ def main(a):
     for i, doc in enumerate(docs):
         docs[i]["Index"] = int(doc["Index"])
         docs[i]["EstimatedYear"] = int(doc["EstimatedYear"]) if doc["EstimatedYear"] != "" else None
-    docs = [d for d in docs if d["EstimatedYear"] is not None]
-    validYears = [d["EstimatedYear"] for d in docs]
-    print(f"{len(validYears)} docs with valid years")
-    startYear, endYear = (min(validYears), max(validYears))
-    print(f"Year range: {startYear} - {endYear}")
+        docs[i]["Period"] = getPeriod(docs[i], a.GRANULARITY) if docs[i]["EstimatedYear"] is not None else None
+    docs = [d for d in docs if d["Period"] is not None]
+    validPeriods = [d["Period"] for d in docs]
+    print(f"{len(validPeriods)} docs with a valid {a.GRANULARITY}")
+    startPeriod, endPeriod = (min(validPeriods), max(validPeriods))
+    print(f"{a.GRANULARITY.capitalize()} range: {getPeriodLabel(startPeriod, a.GRANULARITY)} - {getPeriodLabel(endPeriod, a.GRANULARITY)}")
 
     containersNames = unique([d["Project"] for d in docs])
     print(f"{len(containersNames)} containers: {containersNames}")
 
+    # Collect the docs in each container and period in one pass
+    postings = {}
+    for d in docs:
+        postings.setdefault((d["Project"], d["Period"]), []).append(d["Index"])
+
     # Build containers for the timeline
     print("Building timeline...")
+    periods = getPeriods(startPeriod, endPeriod, a.GRANULARITY)
+    periodKey = "year" if a.GRANULARITY == "year" else "period"
+    periodsKey = f"{periodKey}s"
     containers = []
     counts = []
     for containerName in containersNames:
-        containerYears = []
-        for year in range(startYear, endYear + 1):
-            matches = [d["Index"] for d in docs if d["EstimatedYear"] == year and d["Project"] == containerName]
+        containerPeriods = []
+        for period in periods:
+            matches = postings.get((containerName, period), [])
             count = len(matches)
-            containerYear = {
-               "year": year,
+            containerPeriod = {
+               periodKey: getPeriodLabel(period, a.GRANULARITY),
                "count": count,
                "docs": matches
             }
             counts.append(count)
-            containerYears.append(containerYear)
+            containerPeriods.append(containerPeriod)
         container = {
             "title": containerName,
-            "years": containerYears
+            periodsKey: containerPeriods
         }
         containers.append(container)
 
     # Add normalized counts
     maxCount = max(counts)
     for i, container in enumerate(containers):
-        for j, containerYear in enumerate(container["years"]):
-            countN = 1.0 * containerYear["count"] / maxCount
-            containers[i]["years"][j]["countN"] = round(countN, 3)
-            containers[i]["years"][j]["color"] = valueToColor(lerp((0.2, 1), countN))
+        for j, containerPeriod in enumerate(container[periodsKey]):
+            countN = 1.0 * containerPeriod["count"] / maxCount
+            containers[i][periodsKey][j]["countN"] = round(countN, 3)
+            containers[i][periodsKey][j]["color"] = valueToColor(lerp((0.2, 1), countN))
     print("Writing files to disk...")
 
     for i, note in enumerate(notes):
@@ -80,9 +120,11 @@ def main(a):
 
     dataOut = {
         "collections": containers,
-        "range": [startYear, endYear],
+        "range": [getPeriodLabel(startPeriod, a.GRANULARITY), getPeriodLabel(endPeriod, a.GRANULARITY)],
         "annotations": notes
     }
+    if a.GRANULARITY != "year":
+        dataOut["granularity"] = a.GRANULARITY
     writeJSON(a.OUTPUT_FILE, dataOut)
 
 main(parseArgs())
@@ -3,11 +3,24 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import collections
 from pprint import pprint
 
+import numpy as np
+from scipy import sparse
+
 from utilities import *
 
+# Parts of speech that can be filtered by in the interface
+PARTS_OF_SPEECH = [
+    ("ADJ", "Adjective"),
+    ("ADV", "Adverb"),
+    ("ENTITY", "Entity"),
+    ("NOUN", "Noun"),
+    ("PRON", "Pronoun"),
+    ("PROPN", "Proper Noun"),
+    ("VERB", "Verb")
+]
+
 # Arguments
 def parseArgs():
     """Function to parse script arguments"""
@@ -15,11 +28,24 @@ def parseArgs():
     # pylint: disable=line-too-long
     parser = argparse.ArgumentParser()
     parser.add_argument("-in", dest="INPUT_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_with-dates.csv", help="A BtP dataset file that has been run through: add_resource_data_to_transcript_data.py and parse_dates.py and resolve_dates.py")
-    parser.add_argument("-lemma", dest="LEMMA_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_lemmas.csv", help="A lemma .csv file generated via nlp_transcripts.py")
+    parser.add_argument("-lemma", dest="LEMMA_FILE", default="data/output/mary-church-terrell-advocate-for-african-americans-and-women_2023-01-20_lemmas.csv", help="A lemma .csv file generated via nlp_transcripts.py; its lemma x document .npz matrix is read from the same directory")
     parser.add_argument("-out", dest="OUTPUT_FILE", default="public/data/mary-church-terrell/cloud.json", help="Output JSON file")
+    parser.add_argument("-top", dest="TOP_COUNT", default=1000, type=int, help="Number of most frequent lemmas to keep per project and year")
     args = parser.parse_args()
     return args
 
+def writeEmptyCloud(filename, containersNames, timeRange):
+    """Function to write a word cloud with no words, e.g. when there are no dated documents"""
+    jsonOut = {
+        "words": {"cols": ["lemma", "pos"], "rows": [], "groups": {"pos": []}},
+        "wordDocs": [],
+        "wordBuckets": {"cols": ["wordIndex", "subcollectionIndex", "year", "count"], "rows": [], "groups": {}},
+        "subCollections": containersNames,
+        "partsOfSpeech": PARTS_OF_SPEECH,
+        "timeRange": timeRange
+    }
+    writeJSON(filename, jsonOut)
+
 def main(a):
     """Main function to output transcript data to timeline interface"""
 
@@ -29,53 +55,70 @@ def main(a):
     # Read data from .csv file
     pFields, docs = readCsv(a.INPUT_FILE)
     lFields, lemmas = readCsv(a.LEMMA_FILE)
+    matrix = sparse.load_npz(replaceExtension(a.LEMMA_FILE, ".npz")).tocsr()
 
     # Parse docs
     for i, doc in enumerate(docs):
         docs[i]["Index"] = int(doc["Index"])
         docs[i]["EstimatedYear"] = int(doc["EstimatedYear"]) if doc["EstimatedYear"] != "" else None
-        docs[i]["Lemmas"] = []
     validYears = [d["EstimatedYear"] for d in docs if d["EstimatedYear"] is not None]
     print(f"{len(validYears)} docs with valid years")
+    if len(validYears) <= 0:
+        print("No dated documents; writing an empty word cloud")
+        writeEmptyCloud(a.OUTPUT_FILE, unique([d["Project"] for d in docs]), [])
+        return
     startYear, endYear = (min(validYears), max(validYears))
     print(f"Year range: {startYear} - {endYear}")
 
-    # Parse lemmas
-    for i, lemma in enumerate(lemmas):
-        lemmas[i]["Index"] = i
-        lemmaDocs = [int(dindex) for dindex in lemma["docs"].split(";")]
-        for docIndex in lemmaDocs:
-            docs[docIndex]["Lemmas"].append(i)
-        lemmas[i]["docs"] = lemmaDocs
-
     containersNames = unique([d["Project"] for d in docs])
     print(f"{len(containersNames)} containers: {containersNames}")
 
     # Build buckets for the wordcloud
     print("Building wordcloud...")
-    buckets = []
-    for i, containerName in enumerate(containersNames):
-        for year in range(startYear, endYear + 1):
-            matches = [d["Index"] for d in docs if d["EstimatedYear"] == year and d["Project"] == containerName]
-            containerYearLemmas = []
-            for docIndex in matches:
-                containerYearLemmas += docs[docIndex]["Lemmas"]
-            counter = collections.Counter(containerYearLemmas)
-            frequencies = counter.most_common(1000)
-            for lemmaIndex, count in frequencies:
-                buckets.append({
-                    "_lemmaIndex": lemmaIndex,
-                    "subcollectionIndex": i,
-                    "year": year,
-                    "count": count
-                })
+    lemmaCount = matrix.shape[0]
+    yearCount = endYear - startYear + 1
+    containerCodes = dict([(containerName, i) for i, containerName in enumerate(containersNames)])
+    datedDocs = [d for d in docs if d["EstimatedYear"] is not None]
+    datedDocCount = len(datedDocs)
+    # each dated doc gets a (container, year) bucket code
+    docBuckets = np.array([containerCodes[d["Project"]] * yearCount + d["EstimatedYear"] - startYear for d in datedDocs], dtype=np.int64)
+    docColumns = np.array([d["Index"] for d in datedDocs], dtype=np.int64)
+    if matrix.shape[1] < len(docs):
+        matrix.resize((lemmaCount, len(docs)))
+    # dated doc x lemma matrix, in doc order
+    docLemmas = (matrix[:, docColumns].T.tocsr() > 0).tocoo()
+
+    # count docs per (bucket, lemma) and note the first doc each lemma appears in
+    pairKeys = docBuckets[docLemmas.row] * lemmaCount + docLemmas.col
+    pairKeys, firstEntries, counts = np.unique(pairKeys, return_index=True, return_counts=True)
+    pairBuckets = pairKeys // lemmaCount
+    pairLemmas = pairKeys % lemmaCount
+    firstDocs = docLemmas.row[firstEntries].astype(np.int64)
+    if len(pairKeys) <= 0:
+        print("No lemmas in dated documents; writing an empty word cloud")
+        writeEmptyCloud(a.OUTPUT_FILE, containersNames, [startYear, endYear])
+        return
+
+    # rank like Counter.most_common: by count, then in the order lemmas were first seen in the bucket
+    ranks = -counts.astype(np.int64) * (datedDocCount * lemmaCount) + firstDocs * lemmaCount + pairLemmas
+    bucketStarts = np.concatenate(([0], np.flatnonzero(np.diff(pairBuckets)) + 1))
+    bucketEnds = np.append(bucketStarts[1:], len(pairKeys))
+    selected = []
+    for start, end in zip(bucketStarts, bucketEnds):
+        bucketRanks = ranks[start:end]
+        top = np.arange(end - start)
+        if end - start > a.TOP_COUNT:
+            top = np.argpartition(bucketRanks, a.TOP_COUNT - 1)[:a.TOP_COUNT]
+        selected.append(start + top[np.argsort(bucketRanks[top])])
+    selected = np.concatenate(selected)
+    bucketLemmas = pairLemmas[selected]
 
     print("Prepping lemmas for output")
-    lemmaIndices = unique([b["_lemmaIndex"] for b in buckets])
+    lemmaIndices = unique(bucketLemmas.tolist())
     lemmaCount = len(lemmaIndices)
     lemmasOut = []
     docLemmasOut = []
-    lemmaMap = {}
+    lemmaMap = np.zeros(matrix.shape[0], dtype=np.int64)
     for i, lemmaIndex in enumerate(lemmaIndices):
         lemmaMap[lemmaIndex] = i
         lemma = lemmas[lemmaIndex]
@@ -83,7 +126,7 @@ def main(a):
             lemma["pos"] = "ENTITY"
         lemma["Index"] = i
         lemma["sentiment"] = round(float(lemma["sentiment"]), 2)
-        docIndices = lemma["docs"]
+        docIndices = matrix.indices[matrix.indptr[lemmaIndex]:matrix.indptr[lemmaIndex+1]].tolist()
         for docIndex in docIndices:
             docLemmasOut.append((i, docIndex))
         lemmasOut.append(lemma)
@@ -93,14 +136,17 @@ def main(a):
     print(f"POS: {partsOfSpeech}")
 
     print('Re-mapping lemma indices...')
-    for i, bucket in enumerate(buckets):
-        buckets[i]["wordIndex"] = lemmaMap[bucket["_lemmaIndex"]]
+    bucketRows = np.column_stack((
+        lemmaMap[bucketLemmas],
+        pairBuckets[selected] // yearCount,
+        pairBuckets[selected] % yearCount + startYear,
+        counts[selected]
+    ))
 
     lemmaCols = ["lemma", "pos"]
     lemmaRows, lemmaGroups = unzipList(lemmasOut, lemmaCols, ["pos"])
 
     bucketCols = ["wordIndex", "subcollectionIndex", "year", "count"]
-    bucketRows, bucketGroups = unzipList(buckets, bucketCols, [])
 
     jsonOut = {
         "words": {
@@ -111,19 +157,11 @@ def main(a):
         "wordDocs": flattenList(docLemmasOut),
         "wordBuckets": {
             "cols": bucketCols,
-            "rows": flattenList(bucketRows),
-            "groups": bucketGroups
+            "rows": bucketRows.ravel().tolist(),
+            "groups": {}
         },
         "subCollections": containersNames,
-        "partsOfSpeech": [
-            ("ADJ", "Adjective"),
-            ("ADV", "Adverb"),
-            ("ENTITY", "Entity"),
-            ("NOUN", "Noun"),
-            ("PRON", "Pronoun"),
-            ("PROPN", "Proper Noun"),
-            ("VERB", "Verb")
-        ],
+        "partsOfSpeech": PARTS_OF_SPEECH,
         "timeRange": [startYear, endYear]
     }
 
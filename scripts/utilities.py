@@ -1,40 +1,494 @@
 """Utility functions to support all scripts"""
 
+from array import array
+import atexit
+import base64
+import bisect
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import csv
 import dateparser
 import datetime
+from email.utils import parsedate_to_datetime
+import filecmp
 import glob
+import hashlib
 import itertools
 import json
 import math
 from operator import itemgetter
 import os
+import random
 import re
 import shutil
+import sqlite3
+import struct
 import sys
+import threading
+import time
 import zipfile
 
 import requests
 
+# Optional: for reading and writing columnar (Arrow IPC/Parquet) data files
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Compact binary data files (.bin) start with these bytes, followed by the byte length of a JSON header (uint32, little-endian)
+BINARY_MAGIC = b"MFPB"
+# Typed array types used in binary data files and their array module type codes; all are little-endian
+BINARY_TYPES = {
+    "uint8": "B",
+    "uint16": "H",
+    "uint32": "I",
+    "int8": "b",
+    "int16": "h",
+    "int32": "i",
+    "float64": "d"
+}
+
+# Results of dateparser.parse are cached here across runs (see DateCache)
+DATE_CACHE_FILE = "data/cache/dates.db"
+# Settings used whenever a date is parsed from metadata or transcripts
+DATE_SETTINGS = {'REQUIRE_PARTS': ['year'], 'PREFER_DAY_OF_MONTH': 'first'}
+# Date formats used by item metadata, e.g. 1912, 1925-12-03, 3/25/1906 (month first); getDate reads these without dateparser
+METADATA_DATE_PATTERN = re.compile(r"(\d{4})(?:-(\d{1,2})-(\d{1,2}))?|(\d{1,2})/(\d{1,2})/(\d{4})")
+
+# Responses that are worth retrying (see Downloader)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Columns that writeQueryIndex indexes by default; these are the ones most runs filter by
+QUERY_INDEX_COLUMNS = ["Project", "AssetStatus", "lang", "ItemId", "EstimatedYear"]
+# Splits a line read in binary mode after each carriage return that is not part of a \r\n (see iterCsvLines)
+CARRIAGE_RETURN_PATTERN = re.compile(rb"(?<=\r)(?!\n)")
+
+# The date cache is created the first time a date is parsed (see getDateCache)
+dateCache = None
+# Counts of the dates getDate read directly ("fast") and those it had to hand to dateparser ("fallback")
+dateParseCounts = Counter()
+
+class CsvWriter:
+    """Class for writing rows to a csv (or columnar) file one at a time so the full list never needs to be held in memory.
+    Rows are written to a temporary file that replaces the target file on close, so a script can safely write to the same file it is reading from."""
+
+    def __init__(self, filename, headings, encoding="utf8", verbose=True, batchSize=10000):
+        self.filename = filename
+        self.headings = list(headings)
+        self.verbose = verbose
+        self.batchSize = batchSize
+        self.count = 0
+        self.tempFilename = f"{filename}.tmp"
+        self.isColumnar = isColumnarFile(filename)
+        self.batch = []
+        self.columnarWriter = None
+        self.schema = None
+        self.f = None
+        self.writer = None
+        if self.isColumnar:
+            requireColumnarSupport()
+        else:
+            self.f = open(self.tempFilename, "w", encoding=encoding, newline="")
+            self.writer = csv.writer(self.f)
+            self.writer.writerow(self.headings)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.discard()
+
+    def close(self):
+        """Flush any remaining rows and move the temporary file into place"""
+        if self.isColumnar:
+            self.flushBatch(force=True)
+            self.columnarWriter.close()
+        else:
+            self.f.close()
+        os.replace(self.tempFilename, self.filename)
+        if self.verbose:
+            print(f"Wrote {self.count} rows to {self.filename}")
+
+    def discard(self):
+        """Close and remove the temporary file without touching the target file"""
+        if self.columnarWriter is not None:
+            self.columnarWriter.close()
+        if self.f is not None:
+            self.f.close()
+        if os.path.isfile(self.tempFilename):
+            os.remove(self.tempFilename)
+
+    def flushBatch(self, force=False):
+        """Write buffered rows of a columnar file as one record batch"""
+        if len(self.batch) <= 0 and not (force and self.columnarWriter is None):
+            return
+        table = rowsToTable(self.batch, self.headings)
+        if self.columnarWriter is None:
+            # the first batch determines the column types of the file
+            self.schema = table.schema
+            if self.filename.lower().endswith(".parquet"):
+                self.columnarWriter = pyarrow.parquet.ParquetWriter(self.tempFilename, self.schema)
+            else:
+                self.columnarWriter = pyarrow.ipc.new_file(self.tempFilename, self.schema)
+        else:
+            table = table.cast(self.schema)
+        self.columnarWriter.write_table(table)
+        self.batch = []
+
+    def writerow(self, d):
+        """Write a single dict to file"""
+        self.count += 1
+        if self.isColumnar:
+            self.batch.append(d)
+            if len(self.batch) >= self.batchSize:
+                self.flushBatch()
+            return
+        self.writer.writerow([d[h] if h in d else "" for h in self.headings])
+
+    def writerows(self, arr):
+        """Write an iterable of dicts to file"""
+        for d in arr:
+            self.writerow(d)
+
+class DateCache:
+    """A bounded, least-recently-used cache of dateparser.parse results in front of a SQLite file that is shared across runs and processes.
+    Results are keyed by the date string, the settings, and the dateparser version, so upgrading dateparser or changing settings never re-uses stale results."""
+
+    def __init__(self, filename=DATE_CACHE_FILE, maxSize=10000, commitEvery=1000):
+        self.filename = filename
+        self.maxSize = maxSize
+        self.commitEvery = commitEvery
+        self.dates = OrderedDict()
+        self.conn = None
+        self.pid = None
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        atexit.register(self.close)
+
+    def close(self):
+        """Commit any new results and close the cache file"""
+        if self.conn is not None and self.pid == os.getpid():
+            try:
+                self.conn.commit()
+                self.conn.close()
+            except sqlite3.Error:
+                pass
+        self.conn = None
+        self.pending = 0
+
+    def connect(self):
+        """Return a connection to the cache file; a process that was forked from the one that opened it gets its own, since SQLite connections can't be shared across processes"""
+        if len(self.filename) <= 0:
+            return None
+        if self.conn is not None and self.pid == os.getpid():
+            return self.conn
+        self.pid = os.getpid()
+        self.pending = 0
+        try:
+            makeDirectories(self.filename)
+            self.conn = sqlite3.connect(self.filename, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS dates (key TEXT PRIMARY KEY, value TEXT)")
+        except sqlite3.Error as e:
+            print(f"Could not open date cache {self.filename}: {e}; only caching in memory")
+            self.filename = ""
+            self.conn = None
+        return self.conn
+
+    def get(self, dateString, settings=None):
+        """Return the result of dateparser.parse for a date string and settings, parsing it only if it is not cached"""
+        key = f"{dateparser.__version__}\t{json.dumps(settings, sort_keys=True)}\t{dateString}"
+        if key in self.dates:
+            self.hits += 1
+            self.dates.move_to_end(key)
+            return self.dates[key]
+
+        conn = self.connect()
+        row = None
+        if conn is not None:
+            try:
+                row = conn.execute("SELECT value FROM dates WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+        if row is not None:
+            self.hits += 1
+            date = datetime.datetime.fromisoformat(row[0]) if row[0] else None
+        else:
+            self.misses += 1
+            date = dateparser.parse(dateString, settings=settings)
+            if conn is not None:
+                try:
+                    conn.execute("INSERT OR REPLACE INTO dates (key, value) VALUES (?, ?)", (key, date.isoformat() if date is not None else ""))
+                    self.pending += 1
+                    if self.pending >= self.commitEvery:
+                        conn.commit()
+                        self.pending = 0
+                except sqlite3.Error:
+                    pass
+        self.set(key, date)
+        return date
+
+    def set(self, key, date):
+        """Add a result to memory, evicting the least recently used result if the cache is full"""
+        self.dates[key] = date
+        self.dates.move_to_end(key)
+        while len(self.dates) > self.maxSize:
+            self.dates.popitem(last=False)
+
+class Downloader:
+    """Class for downloading many URLs over a shared pool of connections, at most `workers` at a time and no faster than `rate` requests per second (a token bucket that allows bursts of up to `burst`).
+    Connection errors and 429/5xx responses are retried with exponential backoff. A Retry-After header is waited out in full and pauses every worker, since it applies to the whole client; if it asks for longer than `maxRetryAfter` seconds, the download fails right away instead.
+    Files are written to a temporary file that is renamed once complete, so an interrupted run never leaves a partial file and can be resumed by skipping files that exist.
+    Only a few downloads are queued ahead of the workers, and stopping early cancels the rest (see downloadAll)."""
+
+    def __init__(self, rate=2.0, burst=1, workers=4, retries=5, backoff=1.0, maxBackoff=60.0, maxRetryAfter=3600.0, timeout=30):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.maxRetryAfter = maxRetryAfter
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.pausedUntil = 0.0
+        self.stopped = threading.Event()
+
+    def acquire(self):
+        """Wait until a request is allowed by the rate limit (and any pause)"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate > 0:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                else:
+                    self.tokens = float(self.burst)
+                self.updated = now
+                seconds = self.pausedUntil - now
+                if seconds <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    seconds = (1 - self.tokens) / self.rate
+            if self.stopped.wait(seconds):
+                raise requests.RequestException("Download stopped")
+
+    def download(self, url, filename, headers=None):
+        """Download a URL to a file, retrying failed requests. Returns the response and whether the file changed (only a 200 with new content is written), or raises the last error"""
+        for attempt in range(self.retries + 1):
+            delay = min(self.maxBackoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            canRetry = attempt < self.retries
+            self.acquire()
+            try:
+                response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES:
+                    retryAfter = getRetryAfter(response.headers.get("Retry-After", ""))
+                    response.close()
+                    message = f"{response.status_code} {response.reason} for url: {url}"
+                    if retryAfter is not None and retryAfter > self.maxRetryAfter:
+                        canRetry = False
+                        message += f" (Retry-After of {round(retryAfter)}s is longer than the {round(self.maxRetryAfter)}s limit)"
+                    elif retryAfter is not None:
+                        # Wait as long as the server asks, however long the backoff would have been
+                        delay = retryAfter
+                        self.pause(delay)
+                    elif response.status_code == 429:
+                        self.pause(delay)
+                    raise requests.HTTPError(message, response=response)
+                response.raise_for_status()
+                changed = False
+                if response.status_code == 200:
+                    changed = writeResponse(response, filename)
+                response.close()
+                return (response, changed)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code not in RETRY_STATUS_CODES or not canRetry:
+                    raise
+            except requests.RequestException:
+                if not canRetry:
+                    raise
+            if self.stopped.wait(delay):
+                raise requests.RequestException("Download stopped")
+
+    def downloadAll(self, tasks, headers=None):
+        """Download a list of (url, filename) tuples; yields (task, response, changed, error) tuples as they finish, where either response or error is None.
+        `headers` can be a function that returns the request headers for a task, e.g. for conditional requests.
+        About two tasks per worker are in flight at a time; if the generator is closed early (e.g. on Ctrl-C), queued tasks are cancelled and running ones stop before their next wait"""
+        def run(task):
+            url, filename = task[:2]
+            taskHeaders = headers(task) if callable(headers) else headers
+            try:
+                response, changed = self.download(url, filename, taskHeaders)
+                return (task, response, changed, None)
+            except (requests.RequestException, OSError) as e:
+                return (task, None, False, e)
+
+        self.stopped.clear()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = set()
+        tasks = iter(tasks)
+        try:
+            while True:
+                for task in itertools.islice(tasks, self.workers * 2 - len(pending)):
+                    pending.add(executor.submit(run, task))
+                if len(pending) <= 0:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+        finally:
+            if len(pending) > 0:
+                self.stopped.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def pause(self, seconds):
+        """Hold all requests for a number of seconds, e.g. when the server asks clients to back off"""
+        with self.lock:
+            self.pausedUntil = max(self.pausedUntil, time.monotonic() + seconds)
+
+def appendBinaryBuffer(body, data):
+    """Append bytes to the body of a binary data file at the next 8-byte boundary; returns the offset they were written at"""
+    body += b"\x00" * (-len(body) % 8)
+    offset = len(body)
+    body += data
+    return offset
+
 def appendToFilename(filename, append):
     """Function to append a string to a filename, retaining the file extension"""
     basename, fileExt = os.path.splitext(filename)
     return f"{basename}{append}{fileExt}"
 
+def compileQuery(ors, delimeter="|", caseSensitive=False):
+    """Function to compile a set of rules (see parseQueryString) into a function that checks if an item matches them.
+    Constants are lowercased, parsed as numbers, and split into lists once rather than for every item; the result is the same as matchesQuery."""
+    if isinstance(ors, tuple):
+        ors = [[ors]]
+
+    def compileCondition(key, comparator, value):
+        value = str(value)
+        if not caseSensitive:
+            value = value.lower()
+            getValue = lambda item: str(item[key]).lower()
+        else:
+            getValue = lambda item: str(item[key])
+
+        if comparator in ["IN LIST", "NOT IN LIST", "CONTAINS LIST", "EXCLUDES LIST"]:
+            values = [v.strip() for v in value.split(delimeter)]
+            if comparator == "IN LIST":
+                values = set(values)
+                return lambda item: getValue(item) in values
+            if comparator == "NOT IN LIST":
+                values = set(values)
+                return lambda item: getValue(item) not in values
+            if comparator == "CONTAINS LIST":
+                return lambda item: any(v in getValue(item) for v in values)
+            return lambda item: not any(v in getValue(item) for v in values)
+        if comparator == "CONTAINS":
+            return lambda item: value in getValue(item)
+        if comparator == "EXCLUDES":
+            return lambda item: value not in getValue(item)
+
+        value = parseNumber(value)
+        # a string constant can only equal an item value with the same text, so there is no need to parse the item value as a number
+        if comparator in ["=", "!="] and isinstance(value, str):
+            if comparator == "=":
+                return lambda item: getValue(item) == value
+            return lambda item: getValue(item) != value
+        # the negations mirror matchesQuery, which fails a rule when the opposite comparison is true
+        tests = {
+            "<=": lambda itemValue: not itemValue > value,
+            ">=": lambda itemValue: not itemValue < value,
+            "<": lambda itemValue: not itemValue >= value,
+            ">": lambda itemValue: not itemValue <= value,
+            "!=": lambda itemValue: not itemValue == value,
+            "=": lambda itemValue: not itemValue != value
+        }
+        if comparator not in tests:
+            return lambda item: True
+        test = tests[comparator]
+        return lambda item: test(parseNumber(getValue(item)))
+
+    compiledOrs = []
+    for ands in ors:
+        conditions = []
+        for key, comparator, value in ands:
+            conditions.append(compileCondition(key, comparator, value))
+            # CONTAINS LIST and EXCLUDES LIST decide the result of their group, so any rules after them are ignored
+            if comparator in ["CONTAINS LIST", "EXCLUDES LIST"]:
+                break
+        compiledOrs.append(conditions)
+
+    def matches(item):
+        for conditions in compiledOrs:
+            if all(condition(item) for condition in conditions):
+                return True
+        return False
+
+    return matches
+
 def copyFile(src, dst):
     """Function copying file from src to dst."""
     shutil.copyfile(src, dst)
 
+def decodeBinaryArray(descriptor, body):
+    """Decode a typed array or dictionary-encoded array from the body of a binary data file into a list"""
+    if descriptor["type"] == "dictionary":
+        indices = decodeBinaryArray(descriptor["indices"], body)
+        offsets = decodeBinaryArray(descriptor["offsets"], body)
+        data = body[descriptor["data"]["offset"]:descriptor["data"]["offset"]+descriptor["data"]["byteLength"]]
+        values = [bytes(data[offsets[i]:offsets[i+1]]).decode("utf8") for i in range(len(offsets) - 1)]
+        if descriptor["encoding"] == "json":
+            values = [json.loads(value) for value in values]
+        return [values[i] for i in indices]
+
+    values = array(BINARY_TYPES[descriptor["type"]])
+    start = descriptor["offset"]
+    values.frombytes(body[start:start+descriptor["length"]*values.itemsize])
+    if sys.byteorder != "little":
+        values.byteswap()
+    values = values.tolist()
+    if "null" in descriptor:
+        sentinel = descriptor["null"]["sentinel"]
+        nullValue = descriptor["null"]["value"]
+        values = [nullValue if value == sentinel else value for value in values]
+    return values
+
+def decodeVarints(data):
+    """Decode bytes written by encodeVarints back into a list of non-negative integers"""
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
 def download(url, filename, overwrite=False, prependMessage=""):
     """Function for downloading an arbitrary file as binary file."""
     if os.path.isfile(filename) and not overwrite:
         print(f"{filename} already exists.")
         return
     r = requests.get(url, stream=True, timeout=30)
-    with open(filename, "wb") as f:
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk: # filter out keep-alive new chunks
-                f.write(chunk)
+    writeResponse(r, filename)
     print(f"{prependMessage}Downloaded {filename}.")
 
 def ease(n):
@@ -47,6 +501,66 @@ def emptyDirectory(dirname):
     files = f"{dirname}/*"
     removeFiles(files)
 
+def encodeBinaryArray(values, body):
+    """Append a list of values to the body of a binary data file as a typed array; returns a descriptor of how and where it is stored.
+    Integers use the smallest typed array that fits them (with a sentinel for a single kind of empty value), lists of floats use float64, and everything else is dictionary-encoded."""
+    values = list(values)
+    if len(values) <= 0:
+        return {"type": "uint8", "length": 0, "offset": appendBinaryBuffer(body, b"")}
+
+    nonNulls = [value for value in values if value is not None and value != ""]
+    nullValues = unique([value for value in values if value is None or value == ""])
+    if len(nonNulls) > 0 and len(nullValues) <= 1 and all(isinstance(value, int) and not isinstance(value, bool) for value in nonNulls):
+        high = max(nonNulls) + (1 if len(nullValues) > 0 else 0)
+        intType = getBinaryIntType(min(nonNulls), high)
+        if intType is not None:
+            descriptor = {"type": intType, "length": len(values)}
+            if len(nullValues) > 0:
+                typeCode = BINARY_TYPES[intType]
+                sentinel = 2 ** (8 * array(typeCode).itemsize - (0 if typeCode.isupper() else 1)) - 1
+                descriptor["null"] = {"sentinel": sentinel, "value": nullValues[0]}
+                values = [sentinel if value is None or value == "" else value for value in values]
+            descriptor["offset"] = appendBinaryBuffer(body, toLittleEndian(array(BINARY_TYPES[intType], values)))
+            return descriptor
+
+    if all(isinstance(value, float) for value in values):
+        return {"type": "float64", "length": len(values), "offset": appendBinaryBuffer(body, toLittleEndian(array("d", values)))}
+
+    # Dictionary-encode strings and anything else, storing each unique value once
+    encoding = "utf8" if all(isinstance(value, str) for value in values) else "json"
+    dictionary = {}
+    indices = []
+    for value in values:
+        key = value if encoding == "utf8" else json.dumps(value)
+        index = dictionary.get(key)
+        if index is None:
+            index = len(dictionary)
+            dictionary[key] = index
+        indices.append(index)
+    data = bytearray()
+    offsets = [0]
+    for key in dictionary:
+        data += key.encode("utf8")
+        offsets.append(len(data))
+    return {
+        "type": "dictionary",
+        "encoding": encoding,
+        "length": len(values),
+        "indices": encodeBinaryArray(indices, body),
+        "offsets": {"type": "uint32", "length": len(offsets), "offset": appendBinaryBuffer(body, toLittleEndian(array("I", offsets)))},
+        "data": {"offset": appendBinaryBuffer(body, bytes(data)), "byteLength": len(data)}
+    }
+
+def encodeVarints(values):
+    """Encode a list of non-negative integers as variable-length bytes (7 bits per byte, high bit set when more bytes follow), so small numbers like the gaps between sorted ids take a single byte"""
+    data = bytearray()
+    for value in values:
+        while value > 0x7F:
+            data.append((value & 0x7F) | 0x80)
+            value >>= 7
+        data.append(value)
+    return bytes(data)
+
 def filterByQuery(arr, ors, delimeter="|", caseSensitive=False):
     """Filters a list given a set of rules"""
     if isinstance(ors, tuple):
@@ -55,68 +569,8 @@ def filterByQuery(arr, ors, delimeter="|", caseSensitive=False):
     if len(ors) < 1:
         return arr
 
-    results = []
-    for item in arr:
-        for ands in ors:
-            andValid = True
-            for key, comparator, value in ands:
-                value = str(value)
-                itemValue = str(item[key])
-                if not caseSensitive:
-                    value = value.lower()
-                    itemValue = itemValue.lower()
-                if comparator not in ["CONTAINS", "EXCLUDES", "CONTAINS LIST", "EXCLUDES LIST", "IN LIST", "NOT IN LIST"]:
-                    value = parseNumber(value)
-                    itemValue = parseNumber(itemValue)
-                if comparator in ["IN LIST", "NOT IN LIST", "CONTAINS LIST", "EXCLUDES LIST"]:
-                    value = [v.strip() for v in value.split(delimeter)]
-                if comparator == "<=" and itemValue > value:
-                    andValid = False
-                    break
-                elif comparator == ">=" and itemValue < value:
-                    andValid = False
-                    break
-                elif comparator == "<" and itemValue >= value:
-                    andValid = False
-                    break
-                elif comparator == ">" and itemValue <= value:
-                    andValid = False
-                    break
-                elif comparator == "IN LIST" and itemValue not in value:
-                    andValid = False
-                    break
-                elif comparator == "NOT IN LIST" and itemValue in value:
-                    andValid = False
-                    break
-                elif comparator == "CONTAINS LIST":
-                    andValid = False
-                    for v in value:
-                        if v in itemValue:
-                            andValid = True
-                            break
-                    break
-                elif comparator == "EXCLUDES LIST":
-                    for v in value:
-                        if v in itemValue:
-                            andValid = False
-                            break
-                    break
-                elif comparator == "CONTAINS" and value not in itemValue:
-                    andValid = False
-                    break
-                elif comparator == "EXCLUDES" and value in itemValue:
-                    andValid = False
-                    break
-                elif comparator == "!=" and itemValue == value:
-                    andValid = False
-                    break
-                elif comparator == "=" and itemValue != value:
-                    andValid = False
-                    break
-            if andValid:
-                results.append(item)
-                break
-    return results
+    matches = compileQuery(ors, delimeter, caseSensitive)
+    return [item for item in arr if matches(item)]
 
 def filterByQueryString(arr, queryString, verbose=True):
     """Filters a list given a query string"""
@@ -142,17 +596,50 @@ def flattenList(arr):
     """Flattens a list of lists"""
     return [item for sublist in arr for item in sublist]
 
+def formatPartialDate(date, precision="day"):
+    """Function to format a date as an ISO 8601 date reduced to a precision of year (1905), month (1905-03), or day (1905-03-25)"""
+    if precision == "year":
+        return f"{date.year:04d}"
+    if precision == "month":
+        return f"{date.year:04d}-{date.month:02d}"
+    return f"{date.year:04d}-{date.month:02d}-{date.day:02d}"
+
 def getBasename(fn):
     """Function to return the name of the filename without an extension"""
     return os.path.splitext(os.path.basename(fn))[0]
 
+def getBinaryIntType(low, high):
+    """Return the smallest typed array type that can store integers from low to high, or None if none can"""
+    for intType in (["uint8", "uint16", "uint32"] if low >= 0 else ["int8", "int16", "int32"]):
+        bits = 8 * array(BINARY_TYPES[intType]).itemsize
+        minValue, maxValue = (0, 2 ** bits - 1) if low >= 0 else (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+        if minValue <= low and high <= maxValue:
+            return intType
+    return None
+
 def getDate(dateString):
-    """Funciton to parse an arbitrary date string"""
-    if len(dateString) == 4:
-        year = int(str(dateString))
-        return datetime.datetime(year, 1, 1)
-    else:
-        return dateparser.parse(dateString, settings={'REQUIRE_PARTS': ['year'], 'PREFER_DAY_OF_MONTH': 'first'})
+    """Funciton to parse an arbitrary date string; the formats used by item metadata (see METADATA_DATE_PATTERN) are read directly, and anything else is parsed with dateparser"""
+    match = METADATA_DATE_PATTERN.fullmatch(dateString)
+    if match:
+        year, month, day, slashMonth, slashDay, slashYear = match.groups()
+        try:
+            if slashYear is not None:
+                date = datetime.datetime(int(slashYear), int(slashMonth), int(slashDay))
+            else:
+                date = datetime.datetime(int(year), int(month or 1), int(day or 1))
+            dateParseCounts["fast"] += 1
+            return date
+        except ValueError:
+            pass
+    dateParseCounts["fallback"] += 1
+    return parseDate(dateString)
+
+def getDateCache():
+    """Function to get the date cache shared by everything in this process that parses dates"""
+    global dateCache
+    if dateCache is None:
+        dateCache = DateCache()
+    return dateCache
 
 def getDateRange(dateString):
     """Function to return a date range given a date string"""
@@ -168,7 +655,8 @@ def getDateRange(dateString):
             startDate = getDate(startDate)
             endDate = getDate(endDate)
         # e.g. 1912
-        elif len(dateString) == 4:
+        elif len(dateString) == 4 and dateString.isdigit():
+            dateParseCounts["fast"] += 1
             startYear = int(str(dateString))
             startDate = datetime.datetime(startYear, 1, 1)
             endDate = datetime.datetime(startYear + 1, 1, 1)
@@ -181,6 +669,14 @@ def getDateRange(dateString):
 
     return (startDate, endDate)
 
+def getFileHash(filename):
+    """Function to return the SHA-1 hash of the contents of a file"""
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 def getFilenames(fileString, verbose=False):
     """Function for retrieve a list of files given a string."""
     files = []
@@ -196,6 +692,85 @@ def getFilenames(fileString, verbose=False):
         print(f"Found {fileCount} files")
     return files
 
+def getQueryIndexFilename(filename):
+    """Function to get the filename of the query index of a data file (see writeQueryIndex)"""
+    return f"{filename}.index.json"
+
+def getQueryIndexMatches(column, key, comparator, value):
+    """Function to get the set of row numbers in a query index column that match a single rule"""
+    values = column["values"]
+    number = parseNumber(str(value).lower())
+    # numeric columns are sorted by value, so ranges can be found by bisecting
+    if column["numeric"] and comparator in ["<=", ">=", "<", ">"] and isinstance(number, (int, float)) and not math.isnan(number):
+        numbers = [parseNumber(v.lower()) for v in values]
+        start = 0
+        end = len(numbers)
+        if comparator == "<=":
+            end = bisect.bisect_right(numbers, number)
+        elif comparator == "<":
+            end = bisect.bisect_left(numbers, number)
+        elif comparator == ">=":
+            start = bisect.bisect_left(numbers, number)
+        else:
+            start = bisect.bisect_right(numbers, number)
+        selected = range(start, end)
+    else:
+        matches = compileQuery((key, comparator, value))
+        selected = [i for i, v in enumerate(values) if matches({key: v})]
+
+    rowNumbers = set()
+    for i in selected:
+        rowNumbers.update(itertools.accumulate(decodeVarints(base64.b64decode(column["rows"][i]))))
+    return rowNumbers
+
+def getQueryIndexRows(index, queryString):
+    """Function to look up the rows that match a query string in a query index (see writeQueryIndex).
+    Returns a sorted list of row numbers, or None if the query uses a column that is not indexed so the data needs to be scanned instead."""
+    columns = index["columns"]
+    if any(key not in columns for key in getQueryKeys(queryString)):
+        return None
+    rowNumbers = set(range(index["rowCount"]))
+    for queryStringItem in queryString.split(" | "):
+        ors = parseQueryString(queryStringItem)
+        if len(ors) <= 0:
+            continue
+        # rules are combined the same way as compileQuery, including CONTAINS LIST and EXCLUDES LIST ending their group
+        orMatches = set()
+        for ands in ors:
+            andMatches = rowNumbers
+            for key, comparator, value in ands:
+                andMatches = andMatches & getQueryIndexMatches(columns[key], key, comparator, value)
+                if comparator in ["CONTAINS LIST", "EXCLUDES LIST"]:
+                    break
+            orMatches |= andMatches
+        rowNumbers = orMatches
+    return sorted(rowNumbers)
+
+def getQueryKeys(queryString):
+    """Function to get the list of keys that a query string filters by"""
+    keys = []
+    for queryStringItem in queryString.split(" | "):
+        for ands in parseQueryString(queryStringItem):
+            for key, _comparator, _value in ands:
+                if key not in keys:
+                    keys.append(key)
+    return keys
+
+def getRetryAfter(value):
+    """Function to get the number of seconds a Retry-After header asks to wait, given as seconds or an HTTP date; None if there is no valid value"""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
 def groupList(arr, groupBy, sort=False, desc=True):
     """Group a list by value"""
     groups = []
@@ -214,6 +789,214 @@ def groupList(arr, groupBy, sort=False, desc=True):
         groups = sorted(groups, key=lambda k: k["count"], reverse=isReversed)
     return groups
 
+def indexBy(arr, key):
+    """Index a list of dicts by the value of a key, keeping the first entry for each value; use instead of findInList for repeated lookups"""
+    index = {}
+    for item in arr:
+        if key in item and item[key] not in index:
+            index[item[key]] = item
+    return index
+
+def isBinaryDataFile(filename):
+    """Function to check if a filename should be read or written in the compact binary data format"""
+    return filename.lower().endswith(".bin")
+
+def isColumnarFile(filename):
+    """Function to check if a data file is stored in a columnar format (Arrow IPC or Parquet) based on its file extension"""
+    fileExt = os.path.splitext(filename)[1].lower()
+    return fileExt in (".arrow", ".feather", ".parquet")
+
+def iterCsv(filename, skipLines=0, encoding="utf-8-sig", verbose=True, columns=None, typed=False, batchSize=10000, queryString=""):
+    """Function for reading a csv (or columnar) file one row at a time. Returns the fieldnames and a generator of rows, so only one row (or one batch of a columnar file) is held in memory at a time.
+    Pass a `queryString` to only return the rows that match it; if the file has an up-to-date query index that covers the query (see writeQueryIndex), only the matching rows are read."""
+    if not os.path.isfile(filename):
+        return ([], iter([]))
+
+    if len(queryString) > 0:
+        index = readQueryIndex(filename) if skipLines <= 0 else None
+        rowNumbers = getQueryIndexRows(index, queryString) if index is not None else None
+        if rowNumbers is not None:
+            if verbose:
+                print(f"{len(rowNumbers)} items after filter query '{queryString}' (from {getQueryIndexFilename(filename)})")
+            return iterRowsAt(filename, rowNumbers, index, columns, encoding, typed, verbose)
+
+        # the columns being filtered by need to be read even if they are not returned
+        queryKeys = getQueryKeys(queryString)
+        readColumns = columns if columns is None else columns + [key for key in queryKeys if key not in columns]
+        fieldnames, rows = iterCsv(filename, skipLines, encoding, verbose, readColumns, typed, batchSize)
+        rows = iterFilterByQueryString(rows, queryString, verbose)
+        if readColumns != columns:
+            fieldnames = [field for field in fieldnames if field in columns]
+            rows = ({field: row[field] for field in fieldnames} for row in rows)
+        return (fieldnames, rows)
+
+    if isColumnarFile(filename):
+        requireColumnarSupport()
+        if filename.lower().endswith(".parquet"):
+            reader = pyarrow.parquet.ParquetFile(filename)
+            fieldnames = reader.schema_arrow.names
+            if columns is not None:
+                fieldnames = [field for field in columns if field in fieldnames]
+            batches = reader.iter_batches(batch_size=batchSize, columns=fieldnames)
+        else:
+            reader = pyarrow.ipc.open_file(pyarrow.memory_map(filename))
+            fieldnames = reader.schema.names
+            if columns is not None:
+                fieldnames = [field for field in columns if field in fieldnames]
+            batches = (reader.get_batch(i).select(fieldnames) for i in range(reader.num_record_batches))
+
+        def generateColumnarRows():
+            count = 0
+            for batch in batches:
+                for row in tableToRows(pyarrow.Table.from_batches([batch]), typed):
+                    count += 1
+                    yield row
+            if verbose:
+                print(f"Read {count} rows from {filename}")
+
+        return (list(fieldnames), generateColumnarRows())
+
+    f = open(filename, "r", encoding=encoding, errors="replace")
+    reader = csv.DictReader(itertools.islice(f, skipLines, None), skipinitialspace=True)
+    fieldnames = list(reader.fieldnames) if reader.fieldnames is not None else []
+    if columns is not None:
+        fieldnames = [field for field in columns if field in fieldnames]
+
+    def generateRows():
+        count = 0
+        with f:
+            for row in reader:
+                if columns is not None:
+                    row = {field: row[field] for field in fieldnames}
+                count += 1
+                yield row
+        if verbose:
+            print(f"Read {count} rows from {filename}")
+
+    return (fieldnames, generateRows())
+
+def iterCsvLines(f, encoding, position):
+    """Function for decoding the lines of a csv file opened in binary mode like text mode would, keeping track of the byte offset that has been read up to in `position`"""
+    for line in iter(f.readline, b""):
+        # text mode also treats a lone carriage return as a line break
+        for part in CARRIAGE_RETURN_PATTERN.split(line):
+            if len(part) <= 0:
+                continue
+            # a byte order mark can only be at the start of the file
+            lineEncoding = "utf-8" if encoding == "utf-8-sig" and position["offset"] > 0 else encoding
+            position["offset"] += len(part)
+            text = part.decode(lineEncoding, errors="replace")
+            if text.endswith("\r\n"):
+                text = text[:-2] + "\n"
+            elif text.endswith("\r"):
+                text = text[:-1] + "\n"
+            yield text
+
+def iterCsvRecords(filename, encoding="utf-8-sig"):
+    """Function for reading a csv file one row at a time along with the byte offset each row starts at, so rows can later be read directly (see iterRowsAt). Returns the fieldnames and a generator of (offset, row) tuples."""
+    f = open(filename, "rb")
+    position = {"offset": 0}
+    reader = csv.DictReader(iterCsvLines(f, encoding, position), skipinitialspace=True)
+    fieldnames = list(reader.fieldnames) if reader.fieldnames is not None else []
+
+    def generateRecords():
+        with f:
+            while True:
+                offset = position["offset"]
+                row = next(reader, None)
+                if row is None:
+                    break
+                yield (offset, row)
+
+    return (fieldnames, generateRecords())
+
+def iterFilterByQuery(rows, ors, queryString=False):
+    """Filters an iterable of rows given a set of rules, yielding matching rows one at a time"""
+    matches = compileQuery(ors)
+    count = 0
+    for item in rows:
+        if matches(item):
+            count += 1
+            yield item
+    if queryString is not False:
+        print(f"{count} items after filter query '{queryString}'")
+
+def iterFilterByQueryString(rows, queryString, verbose=True):
+    """Filters an iterable of rows given a query string, yielding matching rows one at a time"""
+    for queryStringItem in queryString.split(" | "):
+        query = parseQueryString(queryStringItem)
+        if len(query) > 0:
+            rows = iterFilterByQuery(rows, query, queryStringItem if verbose else False)
+    yield from rows
+
+def iterRowsAt(filename, rowNumbers, index, columns=None, encoding="utf-8-sig", typed=False, verbose=True):
+    """Function for reading only the rows at a sorted list of row numbers of a csv (or columnar) file, using the row offsets in its query index (see writeQueryIndex). Returns the fieldnames and a generator of rows."""
+    if isColumnarFile(filename):
+        requireColumnarSupport()
+        if filename.lower().endswith(".parquet"):
+            reader = pyarrow.parquet.ParquetFile(filename)
+            fieldnames = reader.schema_arrow.names
+            if columns is not None:
+                fieldnames = [field for field in columns if field in fieldnames]
+            # only read the row groups that have the rows
+            groupStarts = list(itertools.accumulate([reader.metadata.row_group(i).num_rows for i in range(reader.num_row_groups)], initial=0))
+            groups = sorted(set(bisect.bisect_right(groupStarts, rowNumber) - 1 for rowNumber in rowNumbers))
+            groupOffsets = {}
+            offset = 0
+            for group in groups:
+                groupOffsets[group] = offset - groupStarts[group]
+                offset += groupStarts[group+1] - groupStarts[group]
+            table = reader.read_row_groups(groups, columns=fieldnames) if len(groups) > 0 else reader.schema_arrow.empty_table().select(fieldnames)
+            table = table.take([rowNumber + groupOffsets[bisect.bisect_right(groupStarts, rowNumber) - 1] for rowNumber in rowNumbers])
+        else:
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(filename)).read_all()
+            fieldnames = table.column_names
+            if columns is not None:
+                fieldnames = [field for field in columns if field in fieldnames]
+            table = table.select(fieldnames).take(rowNumbers)
+        rows = tableToRows(table, typed)
+        if verbose:
+            print(f"Read {len(rows)} rows from {filename}")
+        return (list(fieldnames), iter(rows))
+
+    offsets = list(itertools.accumulate(decodeVarints(base64.b64decode(index["offsets"]))))
+    f = open(filename, "rb")
+    position = {"offset": 0}
+    allFieldnames = csv.DictReader(iterCsvLines(f, encoding, position), skipinitialspace=True).fieldnames
+    allFieldnames = list(allFieldnames) if allFieldnames is not None else []
+    fieldnames = allFieldnames if columns is None else [field for field in columns if field in allFieldnames]
+
+    def generateRows():
+        reader = None
+        count = 0
+        with f:
+            for rowNumber in rowNumbers:
+                # consecutive rows are read without seeking
+                offset = offsets[rowNumber]
+                if reader is None or position["offset"] != offset:
+                    f.seek(offset)
+                    position["offset"] = offset
+                    reader = csv.DictReader(iterCsvLines(f, encoding, position), fieldnames=allFieldnames, skipinitialspace=True)
+                row = next(reader)
+                if columns is not None:
+                    row = {field: row[field] for field in fieldnames}
+                count += 1
+                yield row
+        if verbose:
+            print(f"Read {count} rows from {filename}")
+
+    return (fieldnames, generateRows())
+
+def iterUniqueBy(rows, key):
+    """Yield the first of each row with a given value of a key, in the original order, from any iterable of rows"""
+    seen = set()
+    for row in rows:
+        value = row[key]
+        if value in seen:
+            continue
+        seen.add(value)
+        yield row
+
 def lerp(ab, amount):
     """Interpolate between two values"""
     a, b = ab
@@ -228,6 +1011,74 @@ def makeDirectories(filenames):
         if not os.path.exists(dirname):
             os.makedirs(dirname)
 
+def matchesQuery(item, ors, delimeter="|", caseSensitive=False):
+    """Check if an item matches a set of rules"""
+    for ands in ors:
+        andValid = True
+        for key, comparator, value in ands:
+            value = str(value)
+            itemValue = str(item[key])
+            if not caseSensitive:
+                value = value.lower()
+                itemValue = itemValue.lower()
+            if comparator not in ["CONTAINS", "EXCLUDES", "CONTAINS LIST", "EXCLUDES LIST", "IN LIST", "NOT IN LIST"]:
+                value = parseNumber(value)
+                itemValue = parseNumber(itemValue)
+            if comparator in ["IN LIST", "NOT IN LIST", "CONTAINS LIST", "EXCLUDES LIST"]:
+                value = [v.strip() for v in value.split(delimeter)]
+            if comparator == "<=" and itemValue > value:
+                andValid = False
+                break
+            elif comparator == ">=" and itemValue < value:
+                andValid = False
+                break
+            elif comparator == "<" and itemValue >= value:
+                andValid = False
+                break
+            elif comparator == ">" and itemValue <= value:
+                andValid = False
+                break
+            elif comparator == "IN LIST" and itemValue not in value:
+                andValid = False
+                break
+            elif comparator == "NOT IN LIST" and itemValue in value:
+                andValid = False
+                break
+            elif comparator == "CONTAINS LIST":
+                andValid = False
+                for v in value:
+                    if v in itemValue:
+                        andValid = True
+                        break
+                break
+            elif comparator == "EXCLUDES LIST":
+                for v in value:
+                    if v in itemValue:
+                        andValid = False
+                        break
+                break
+            elif comparator == "CONTAINS" and value not in itemValue:
+                andValid = False
+                break
+            elif comparator == "EXCLUDES" and value in itemValue:
+                andValid = False
+                break
+            elif comparator == "!=" and itemValue == value:
+                andValid = False
+                break
+            elif comparator == "=" and itemValue != value:
+                andValid = False
+                break
+        if andValid:
+            return True
+    return False
+
+def parseDate(dateString, settings=None):
+    """Function to parse a date string with dateparser, re-using the results of previous runs (see DateCache)"""
+    if settings is None:
+        settings = DATE_SETTINGS
+    return getDateCache().get(dateString, settings)
+
 def parseNumber(string, alwaysFloat=False):
     """Given a string, attempts to parse a number"""
     if isinstance(string, list):
@@ -242,6 +1093,17 @@ def parseNumber(string, alwaysFloat=False):
     except TypeError:
         return ""
 
+def parsePartialDate(dateString):
+    """Function to parse an ISO 8601 date written by formatPartialDate; returns a tuple of (date, precision) where the missing parts of the date are 1, or (None, None) if the string is not a date"""
+    parts = dateString.strip().split("-")
+    if len(parts) > 3 or not all(part.isdigit() for part in parts):
+        return (None, None)
+    values = [int(part) for part in parts] + [1] * (3 - len(parts))
+    try:
+        return (datetime.datetime(*values), ["year", "month", "day"][len(parts)-1])
+    except ValueError:
+        return (None, None)
+
 def parseQueryString(queryString):
     """Function for parsing a query string"""
     if len(queryString) <= 0:
@@ -262,34 +1124,96 @@ def parseQueryString(queryString):
     return ors
 
 def printProgress(step, total, prepend=""):
-    """Function for printing percentage of progress made"""
-    progress = round(1.0*step/total*100,2)
+    """Function for printing percentage of progress made; if the total is unknown (e.g. when streaming rows), prints the step count instead"""
     sys.stdout.write('\r')
-    sys.stdout.write(f"{prepend}{progress}%")
+    if total is None or total <= 0:
+        sys.stdout.write(f"{prepend}{step}")
+    else:
+        progress = round(1.0*step/total*100,2)
+        sys.stdout.write(f"{prepend}{progress}%")
     sys.stdout.flush()
 
-def readCsv(filename, skipLines=0, encoding="utf-8-sig", readDict=True, verbose=True):
-    """Function for reading a csv file given a filename string."""
+def readBinaryData(filename):
+    """Function for reading a compact binary data file written by writeBinaryData; returns the same data as the equivalent .json file"""
+    with open(filename, "rb") as f:
+        contents = f.read()
+    if contents[:4] != BINARY_MAGIC:
+        raise ValueError(f"{filename} is not a binary data file")
+    headerLength = struct.unpack("<I", contents[4:8])[0]
+    header = json.loads(contents[8:8+headerLength].decode("utf8"))
+    bodyStart = 8 + headerLength + (-(8 + headerLength) % 8)
+    body = memoryview(contents)[bodyStart:]
+
+    def decode(node):
+        if isinstance(node, dict) and "$table" in node:
+            table = node["$table"]
+            columns = [decodeBinaryArray(descriptor, body) for descriptor in table["columns"]]
+            rows = [list(row) for row in zip(*columns)] if len(columns) > 0 else [[] for _ in range(table["rowCount"])]
+            decoded = {
+                "cols": table["cols"],
+                "rows": flattenList(rows) if table["flattened"] else rows
+            }
+            if "groups" in table:
+                decoded["groups"] = dict([(field, decodeBinaryArray(descriptor, body)) for field, descriptor in table["groups"].items()])
+            return decoded
+        if isinstance(node, dict) and "$array" in node:
+            return decodeBinaryArray(node["$array"], body)
+        if isinstance(node, dict):
+            return dict([(key, decode(value)) for key, value in node.items()])
+        if isinstance(node, list):
+            return [decode(value) for value in node]
+        return node
+
+    return decode(header["data"])
+
+def readColumnarTable(filename, columns=None):
+    """Function for reading an Arrow IPC or Parquet file into an Arrow table, optionally only reading a subset of columns"""
+    requireColumnarSupport()
+    isParquet = filename.lower().endswith(".parquet")
+    if columns is not None:
+        schema = pyarrow.parquet.read_schema(filename) if isParquet else pyarrow.ipc.open_file(filename).schema
+        columns = [col for col in columns if col in schema.names]
+    if isParquet:
+        return pyarrow.parquet.read_table(filename, columns=columns)
+    return pyarrow.feather.read_table(filename, columns=columns)
+
+def readCsv(filename, skipLines=0, encoding="utf-8-sig", readDict=True, verbose=True, columns=None, typed=False, queryString=""):
+    """Function for reading a csv file given a filename string. Files ending in .arrow, .feather, or .parquet are read as columnar data; pass `columns` to only read a subset of columns.
+    Pass a `queryString` to only return the rows that match it, using the file's query index when possible (see iterCsv)."""
+    if len(queryString) > 0 and readDict:
+        fieldnames, rows = iterCsv(filename, skipLines, encoding, verbose, columns, typed, queryString=queryString)
+        return (fieldnames, list(rows))
+
     rows = []
     fieldnames = []
-    if os.path.isfile(filename):
-        lines = []
+    if os.path.isfile(filename) and isColumnarFile(filename):
+        table = readColumnarTable(filename, columns)
+        fieldnames = list(table.column_names)
+        rows = tableToRows(table, typed)
+        if not readDict:
+            rows = [[row[field] for field in fieldnames] for row in rows]
+        if verbose:
+            print(f"Read {len(rows)} rows from {filename}")
+    elif os.path.isfile(filename):
         with open(filename, 'r', encoding=encoding, errors="replace") as f:
-            lines = list(f)
-        if skipLines > 0:
-            lines = lines[skipLines:]
-        if readDict:
-            reader = csv.DictReader(lines, skipinitialspace=True)
-            fieldnames = list(reader.fieldnames)
-        else:
-            reader = csv.reader(lines, skipinitialspace=True)
-        rows = list(reader)
+            lines = itertools.islice(f, skipLines, None)
+            if readDict:
+                reader = csv.DictReader(lines, skipinitialspace=True)
+                fieldnames = list(reader.fieldnames) if reader.fieldnames is not None else []
+            else:
+                reader = csv.reader(lines, skipinitialspace=True)
+            rows = list(reader)
+        if readDict and columns is not None:
+            fieldnames = [field for field in columns if field in fieldnames]
+            rows = [{field: row[field] for field in fieldnames} for row in rows]
         if verbose:
             print(f"Read {len(rows)} rows from {filename}")
     return (fieldnames, rows)
 
 def readJSON(filename):
-    """Function for reading a json file given a filename string."""
+    """Function for reading a json file given a filename string. Files ending in .bin are read as compact binary data."""
+    if isBinaryDataFile(filename) and os.path.isfile(filename):
+        return readBinaryData(filename)
     data = {}
     if os.path.isfile(filename):
         with open(filename, encoding="utf8") as f:
@@ -299,6 +1223,21 @@ def readJSON(filename):
                 data = {}
     return data
 
+def readQueryIndex(filename):
+    """Function for reading the query index of a data file (see writeQueryIndex); returns None if there is no index or the file's contents have changed since it was written"""
+    indexFilename = getQueryIndexFilename(filename)
+    if not os.path.isfile(indexFilename) or not os.path.isfile(filename):
+        return None
+    index = readJSON(indexFilename)
+    source = index.get("source", {})
+    stat = os.stat(filename)
+    if source.get("size") != stat.st_size:
+        return None
+    # a file that was rewritten with the same contents (e.g. by a stage that updates it in place) keeps its index
+    if source.get("mtime") != stat.st_mtime_ns and source.get("hash") != getFileHash(filename):
+        return None
+    return index
+
 def readText(filename, lines=False):
     """Function to read a text file"""
     contents = ""
@@ -331,6 +1270,11 @@ def replaceExtension(fn, newExention=".txt"):
     pathname = os.path.dirname(fn)
     return f"{pathname}/{getBasename(fn)}{newExention}"
 
+def requireColumnarSupport():
+    """Function to make sure the optional pyarrow dependency is available for columnar data files"""
+    if pyarrow is None:
+        raise ImportError("Reading or writing .arrow, .feather, or .parquet files requires pyarrow. Run: pip install pyarrow")
+
 def roundInt(value):
     """Round a value and convert to integer"""
     return int(round(value))
@@ -339,6 +1283,12 @@ def rgbToHex(rgb, prefix="#"):
     """Convert RGB to Hex string"""
     return prefix + '%02x%02x%02x' % tuple(rgb)
 
+def rowsToTable(arr, headings):
+    """Function for converting a list of dicts to a typed Arrow table"""
+    requireColumnarSupport()
+    arrays = [valuesToArrowArray([d[h] if h in d else "" for d in arr]) for h in headings]
+    return pyarrow.Table.from_arrays(arrays, names=headings)
+
 def sortBy(arr, conditions):
     """Sort an array by a list of conditions"""
     if isinstance(conditions, tuple):
@@ -392,6 +1342,25 @@ def stringToFilename(string):
 
     return string
 
+def tableToRows(table, typed=False):
+    """Function for converting an Arrow table to a list of dicts; unless typed, values are returned as strings just like they would be read from a .csv file"""
+    names = table.column_names
+    columns = []
+    for name, column in zip(names, table.columns):
+        values = column.to_pylist()
+        isString = pyarrow.types.is_string(column.type) or pyarrow.types.is_large_string(column.type)
+        if not typed and not isString:
+            values = ["" if value is None else str(value) for value in values]
+        columns.append(values)
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+def toLittleEndian(values):
+    """Return the bytes of an array in little-endian order"""
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
 def unique(arr):
     """Function for turning a list of values into a list of unique values"""
     return list(set(arr))
@@ -406,19 +1375,22 @@ def unzipFile(filename, targetDir=False):
 def unzipList(arr, cols, colGroups):
     """Break out a list of objects into rows and columns"""
     groups = {}
+    groupIndices = {}
     for field in colGroups:
         groups[field] = []
+        groupIndices[field] = {}
     rows = []
     for item in arr:
         row = []
         for col in cols:
             value = item[col]
             # check if we should group this value to reduce redudancy and save file size
-            if col in colGroups:
-                groupValues = groups[col]
-                if value not in groupValues:
-                    groupValues.append(value)
-                value = groupValues.index(value)
+            if col in groupIndices:
+                indices = groupIndices[col]
+                if value not in indices:
+                    indices[value] = len(groups[col])
+                    groups[col].append(value)
+                value = indices[value]
             row.append(value)
         rows.append(row)
     return (rows, groups)
@@ -433,8 +1405,101 @@ def valueToColor(value):
     rgb = tuple([roundInt(p*255) for p in rgbn])
     return rgbToHex(rgb)
 
+def valuesToArrowArray(values):
+    """Function to convert a list of values to an Arrow array, inferring an integer, float, or string type; empty values become nulls in numeric arrays"""
+    requireColumnarSupport()
+    present = [value for value in values if value is not None and value != ""]
+    isNumeric = len(present) > 0 and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present)
+    if isNumeric:
+        arrowType = pyarrow.int64() if all(isinstance(value, int) for value in present) else pyarrow.float64()
+        return pyarrow.array([None if value is None or value == "" else value for value in values], type=arrowType)
+    return pyarrow.array(["" if value is None else str(value) for value in values], type=pyarrow.string())
+
+def writeBinaryData(filename, data, verbose=True, minArrayLength=32):
+    """Function to write JSON-like data to a compact binary file that browsers can read straight into typed arrays.
+    Layout: the 4 bytes "MFPB", a uint32 (little-endian) header length, a UTF-8 JSON header, then a body of typed arrays each starting on an 8-byte boundary.
+    Tables (objects with "cols" and "rows", as produced by unzipList) are stored column by column and their groups as arrays;
+    lists of at least `minArrayLength` numbers are stored as typed arrays; everything else stays in the header.
+    In the header, tables are replaced by {"$table": {"cols", "rowCount", "flattened", "columns", "groups"?}} and arrays by {"$array": descriptor},
+    where a descriptor is {"type", "length", "offset"} into the body (plus "null": {"sentinel", "value"} for empty values) or,
+    for "type": "dictionary", {"encoding": "utf8"|"json", "indices", "offsets", "data"} pointing to unique values stored as UTF-8 strings."""
+    body = bytearray()
+
+    def encode(node):
+        if isinstance(node, dict) and "cols" in node and "rows" in node:
+            cols = node["cols"]
+            rows = node["rows"]
+            flattened = len(rows) > 0 and not isinstance(rows[0], (list, tuple))
+            if flattened:
+                rows = [rows[i:i+len(cols)] for i in range(0, len(rows), len(cols))]
+            table = {
+                "cols": cols,
+                "rowCount": len(rows),
+                "flattened": flattened,
+                "columns": [encodeBinaryArray([row[j] for row in rows], body) for j in range(len(cols))]
+            }
+            if "groups" in node:
+                table["groups"] = dict([(field, encodeBinaryArray(values, body)) for field, values in node["groups"].items()])
+            return {"$table": table}
+        if isinstance(node, dict):
+            return dict([(key, encode(value)) for key, value in node.items()])
+        if isinstance(node, (list, tuple)):
+            if len(node) >= minArrayLength and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in node):
+                return {"$array": encodeBinaryArray(node, body)}
+            return [encode(value) for value in node]
+        return node
+
+    header = json.dumps({"version": 1, "data": encode(data)}).encode("utf8")
+    with open(filename, "wb") as f:
+        f.write(BINARY_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        f.write(b"\x00" * (-(8 + len(header)) % 8))
+        f.write(body)
+    if verbose:
+        print(f"Wrote data to {filename}")
+
+def writeColumnarTable(filename, table):
+    """Function for writing an Arrow table to an Arrow IPC or Parquet file"""
+    requireColumnarSupport()
+    if filename.lower().endswith(".parquet"):
+        pyarrow.parquet.write_table(table, filename)
+    else:
+        pyarrow.feather.write_feather(table, filename)
+
+def writeColumns(filename, arr, headings, sourceFilename, verbose=True):
+    """Function for writing a subset of columns on top of an existing data file, e.g. after reading only a few columns from it. The list must have the same rows in the same order as the source file."""
+    if isColumnarFile(sourceFilename) and isColumnarFile(filename):
+        # Only the updated columns are converted; the rest of the table stays in Arrow memory
+        table = readColumnarTable(sourceFilename)
+        if table.num_rows != len(arr):
+            raise ValueError(f"Expected {table.num_rows} rows to write to {filename}, but got {len(arr)}")
+        for h in headings:
+            array = valuesToArrowArray([d[h] if h in d else "" for d in arr])
+            if h in table.column_names:
+                table = table.set_column(table.column_names.index(h), h, array)
+            else:
+                table = table.append_column(h, array)
+        writeColumnarTable(filename, table)
+    else:
+        fieldnames, rows = readCsv(sourceFilename, verbose=False, typed=True)
+        if len(rows) != len(arr):
+            raise ValueError(f"Expected {len(rows)} rows to write to {filename}, but got {len(arr)}")
+        for i, d in enumerate(arr):
+            for h in headings:
+                rows[i][h] = d[h] if h in d else ""
+        fieldnames += [h for h in headings if h not in fieldnames]
+        writeCsv(filename, rows, fieldnames, verbose=False)
+    if verbose:
+        print(f"Wrote {len(arr)} rows to {filename}")
+
 def writeCsv(filename, arr, headings, encoding="utf8", verbose=True):
-    """Function for writing data to a .csv file"""
+    """Function for writing data to a .csv file; files ending in .arrow, .feather, or .parquet are written as typed columnar data"""
+    if isColumnarFile(filename):
+        writeColumnarTable(filename, rowsToTable(arr, headings))
+        if verbose:
+            print(f"Wrote {len(arr)} rows to {filename}")
+        return
     with open(filename, "w", encoding=encoding, newline="") as f:
         writer = csv.writer(f)
         writer.writerow(headings)
@@ -450,7 +1515,10 @@ def writeCsv(filename, arr, headings, encoding="utf8", verbose=True):
         print(f"Wrote {len(arr)} rows to {filename}")
 
 def writeJSON(filename, data, verbose=True, pretty=False):
-    """Function to write JSON data to file"""
+    """Function to write JSON data to file. Files ending in .bin are written as compact binary data (see writeBinaryData)."""
+    if isBinaryDataFile(filename):
+        writeBinaryData(filename, data, verbose)
+        return
     with open(filename, 'w') as f:
         if pretty:
             json.dump(data, f, indent=4)
@@ -459,6 +1527,109 @@ def writeJSON(filename, data, verbose=True, pretty=False):
         if verbose:
             print(f"Wrote data to {filename}")
 
+def writeQueryIndex(filename, columns=None, encoding="utf-8-sig", verbose=True):
+    """Function to write a sidecar query index of a csv (or columnar) file (e.g. data.csv.index.json) that iterCsv and readCsv use to only read the rows that match a query.
+    For each column, it stores each value and the numbers of the rows with that value (as base64 delta + varint encoded lists); numeric columns are sorted by value for range queries.
+    For csv files, it also stores the byte offset of each row. The index is ignored once the file's contents change."""
+    if columns is None:
+        columns = QUERY_INDEX_COLUMNS
+    stat = os.stat(filename)
+    offsets = None
+    if isColumnarFile(filename):
+        fieldnames, rows = iterCsv(filename, columns=columns, verbose=False)
+    else:
+        fieldnames, records = iterCsvRecords(filename, encoding)
+        offsets = []
+
+        def generateRows():
+            # check that rows read from offsets match rows read in text mode
+            _fieldnames, textRows = iterCsv(filename, encoding=encoding, verbose=False)
+            for record, textRow in itertools.zip_longest(records, textRows):
+                if record is None or textRow is None or record[1] != textRow:
+                    raise ValueError(f"Could not find the row offsets of {filename}")
+                offsets.append(record[0])
+                yield textRow
+
+        rows = generateRows()
+
+    columns = [column for column in columns if column in fieldnames]
+    valueRows = {column: {} for column in columns}
+    rowCount = 0
+    for rowNumber, row in enumerate(rows):
+        for column in columns:
+            valueRows[column].setdefault(row[column], []).append(rowNumber)
+        rowCount += 1
+
+    def encodeRowNumbers(rowNumbers):
+        return base64.b64encode(encodeVarints([b - a for a, b in zip([0] + rowNumbers, rowNumbers)])).decode("ascii")
+
+    indexColumns = {}
+    for column in columns:
+        numbers = {value: parseNumber(value.lower()) for value in valueRows[column]}
+        numeric = len(numbers) > 0 and all(isinstance(n, (int, float)) and not math.isnan(n) for n in numbers.values())
+        values = sorted(valueRows[column], key=lambda value: numbers[value]) if numeric else sorted(valueRows[column])
+        indexColumns[column] = {
+            "numeric": numeric,
+            "values": values,
+            "rows": [encodeRowNumbers(valueRows[column][value]) for value in values]
+        }
+    index = {
+        "source": {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": getFileHash(filename)},
+        "rowCount": rowCount,
+        "columns": indexColumns
+    }
+    if offsets is not None:
+        index["offsets"] = encodeRowNumbers(offsets)
+    indexFilename = getQueryIndexFilename(filename)
+    writeJSON(indexFilename, index, verbose=False)
+    if verbose:
+        print(f"Indexed {len(columns)} columns of {rowCount} rows in {indexFilename}")
+
+def writeResponse(response, filename):
+    """Function to stream the body of a response to a temporary file and move it to the filename once complete, so a failed download never leaves a partial file.
+    An existing file with the same content is left alone; returns whether the file was written"""
+    tempFilename = f"{filename}.tmp"
+    try:
+        with open(tempFilename, "wb") as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                if chunk: # filter out keep-alive new chunks
+                    f.write(chunk)
+        if os.path.isfile(filename) and filecmp.cmp(tempFilename, filename, shallow=False):
+            return False
+        os.replace(tempFilename, filename)
+        return True
+    finally:
+        if os.path.isfile(tempFilename):
+            os.remove(tempFilename)
+
+def writeShardedTable(filename, arr, cols, colGroups, shardSize, isFlattened=False, verbose=True):
+    """Function to write a list of objects in the cols/rows/groups layout of unzipList, split into shards of `shardSize` rows.
+    The file itself becomes a manifest that lists each shard's file name, index of its first row, and row count, so clients can fetch only the shards with the rows they need.
+    Each shard (e.g. transcripts-0.json) has its own groups, and row indices within a shard start at 0. A shard size of 0 writes everything to a single file."""
+    if shardSize <= 0:
+        rows, groups = unzipList(arr, cols, colGroups)
+        writeJSON(filename, {"cols": cols, "rows": flattenList(rows) if isFlattened else rows, "groups": groups}, verbose)
+        return
+
+    # Remove shards from previous runs
+    basename, fileExt = os.path.splitext(filename)
+    removeFiles(f"{basename}-[0-9]*{fileExt}")
+    shards = []
+    for shardIndex, start in enumerate(range(0, len(arr), shardSize)):
+        shardFilename = appendToFilename(filename, f"-{shardIndex}")
+        rows, groups = unzipList(arr[start:start+shardSize], cols, colGroups)
+        writeJSON(shardFilename, {"cols": cols, "rows": flattenList(rows) if isFlattened else rows, "groups": groups}, verbose=False)
+        shards.append({"file": os.path.basename(shardFilename), "start": start, "count": len(rows)})
+    manifest = {
+        "cols": cols,
+        "count": len(arr),
+        "shardSize": shardSize,
+        "shards": shards
+    }
+    writeJSON(filename, manifest, verbose=False)
+    if verbose:
+        print(f"Wrote manifest and {len(shards)} shards of {shardSize} rows to {filename}")
+
 def writeText(filename, text, encoding="utf8"):
     """Function to write text data to file"""
     with open(filename, "w", encoding=encoding, errors="replace") as f:
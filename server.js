@@ -1,4 +1,6 @@
 const express = require('express');
+const fs = require('fs');
+const path = require('path');
 
 let port = 2222;
 const app = express();
@@ -6,4 +8,97 @@ const app = express();
 if (process.argv.length > 2) port = parseInt(process.argv[2], 10);
 app.use(express.urlencoded({ extended: true }));
 app.use(express.static('./public/'));
+
+// Full-text search over databases written by scripts/transcript_data_to_sqlite.py to data/search/{project}.db
+const searchDir = path.join(__dirname, 'data', 'search');
+const searchDatabases = {};
+let Database = false;
+
+function escapeHtml(text) {
+  return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+}
+
+function getSearchDatabase(project) {
+  const filename = path.join(searchDir, `${project}.db`);
+  if (!fs.existsSync(filename)) return false;
+  // better-sqlite3 is only needed by this endpoint, so it is not loaded until the first search
+  // eslint-disable-next-line global-require
+  if (Database === false) Database = require('better-sqlite3');
+  // re-open the database when the exporter replaces it
+  const { mtimeMs } = fs.statSync(filename);
+  const cached = searchDatabases[project];
+  if (cached && cached.mtimeMs === mtimeMs) return cached.db;
+  if (cached) cached.db.close();
+  const db = new Database(filename, { readonly: true, fileMustExist: true });
+  searchDatabases[project] = { db, mtimeMs };
+  return db;
+}
+
+// Quote each word so user input is never parsed as FTS5 query syntax; a trailing * keeps its prefix search meaning
+function toMatchQuery(q) {
+  const words = q.match(/[\p{L}\p{N}_]+\*?/gu) || [];
+  return words.map((word) => (word.endsWith('*') ? `"${word.slice(0, -1)}"*` : `"${word}"`)).join(' ');
+}
+
+app.get('/api/search', (req, res) => {
+  const project = String(req.query.project || 'mary-church-terrell');
+  const q = String(req.query.q || '');
+  const page = Math.max(parseInt(req.query.page, 10) || 1, 1);
+  const pageSize = Math.min(Math.max(parseInt(req.query.pageSize, 10) || 20, 1), 100);
+  const matchQuery = toMatchQuery(q);
+  if (!/^[\w-]+$/.test(project)) {
+    res.status(400).json({ error: 'Invalid project' });
+    return;
+  }
+  if (matchQuery.length <= 0) {
+    res.status(400).json({ error: 'Missing query' });
+    return;
+  }
+
+  let db;
+  try {
+    db = getSearchDatabase(project);
+  } catch (error) {
+    res.status(503).json({ error: `Search is not available: ${error.message}` });
+    return;
+  }
+  if (db === false) {
+    res.status(404).json({ error: `No search database for ${project}` });
+    return;
+  }
+
+  // filter by sub-collection (the Project column) and year range
+  const conditions = ['transcripts MATCH @matchQuery'];
+  const params = { matchQuery };
+  if (req.query.subCollection) {
+    conditions.push('docs.Project = @subCollection');
+    params.subCollection = String(req.query.subCollection);
+  }
+  if (req.query.startYear) {
+    conditions.push('docs.EstimatedYear >= @startYear');
+    params.startYear = parseInt(req.query.startYear, 10);
+  }
+  if (req.query.endYear) {
+    conditions.push('docs.EstimatedYear <= @endYear');
+    params.endYear = parseInt(req.query.endYear, 10);
+  }
+  const where = `FROM transcripts JOIN docs ON docs.id = transcripts.rowid WHERE ${conditions.join(' AND ')}`;
+  // snippets are marked with control characters so the text can be escaped before adding the highlight tags
+  const columns = db.prepare('SELECT * FROM docs LIMIT 0').columns().map((column) => column.name).filter((name) => name !== 'Transcription');
+  const resultsSql = `SELECT ${columns.map((name) => `docs.${name}`).join(', ')}, snippet(transcripts, 0, char(2), char(3), '…', 32) AS snippet ${where} ORDER BY bm25(transcripts) LIMIT @limit OFFSET @offset`;
+
+  try {
+    const { total } = db.prepare(`SELECT COUNT(*) AS total ${where}`).get(params);
+    const results = db.prepare(resultsSql).all({ ...params, limit: pageSize, offset: (page - 1) * pageSize });
+    results.forEach((result) => {
+      result.snippet = escapeHtml(result.snippet).replace(/\u0002/g, '<strong>').replace(/\u0003/g, '</strong>');
+    });
+    res.json({
+      q, page, pageSize, total, results,
+    });
+  } catch (error) {
+    res.status(400).json({ error: error.message });
+  }
+});
+
 app.listen(port, () => console.log(`Listening on port ${port}`));